@@ -0,0 +1,163 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+from metrics import registry
+
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))
+API_RETRIES = int(os.getenv("API_RETRIES", "2"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.5"))
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "100"))
+API_CACHE_SIZE = int(os.getenv("API_CACHE_SIZE", "256"))
+
+RETRY_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "PUT", "PATCH", "DELETE"}
+
+# The Telegram user the current handler acts for, sent along so the API rate-limits per user rather than per bot.
+acting_user = contextvars.ContextVar("acting_user", default=None)
+
+logger = logging.getLogger(__name__)
+
+api_call_duration = registry.histogram(
+    "bot_api_call_duration_seconds", "Time of API calls made by the bot, retries included.",
+    ("method", "path", "status"))
+
+
+class ApiResponse:
+    """Status code and decoded JSON body of an API call; status_code is None if the API was unreachable."""
+
+    def __init__(self, status_code, data, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+
+    def json(self):
+        return self.data if self.data is not None else {}
+
+
+class RateLimited(Exception):
+    """The API refused a call with 429; retry_after is the number of seconds it asked to wait."""
+
+    def __init__(self, retry_after, error=None):
+        super().__init__(error or "Too many requests")
+        self.retry_after = retry_after
+        self.error = error
+
+
+class ApiClient:
+    """Async client for the Flask API sharing one pooled keep-alive session."""
+
+    def __init__(self, base_url, timeout=API_TIMEOUT, retries=API_RETRIES, backoff=API_RETRY_BACKOFF,
+                 pool_size=API_POOL_SIZE):
+        self.base_url = (base_url or "").rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._session = None
+        # (path, params) -> (etag, data) of the last 200 response to a conditional GET.
+        self._cache = OrderedDict()
+
+    def session(self):
+        # Created lazily because aiohttp sessions must be bound to the running event loop.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def request(self, method, path, timeout=None, **kwargs):
+        """Send a request and record how long it took, retries included.
+
+        Raises RateLimited when the API answers 429, so callers do not each have to tell it apart from failures.
+        """
+        method = method.upper()
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        user = acting_user.get()
+        if user is not None:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "X-Telegram-Id": str(user)}
+        started = time.perf_counter()
+        response = await self.send(method, path, **kwargs)
+        api_call_duration.observe(time.perf_counter() - started, method=method, path=path,
+                                  status=response.status_code or "error")
+        if response.status_code == 429:
+            raise RateLimited(retry_after(response), response.json().get("error"))
+        return response
+
+    async def send(self, method, path, **kwargs):
+        """Retry idempotent calls on connection errors and 502/503/504 with backoff.
+
+        Non-idempotent calls are only retried when the connection could not be established,
+        since the request cannot have reached the API in that case.
+        """
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                async with self.session().request(method, f"{self.base_url}{path}", **kwargs) as response:
+                    if response.status in RETRY_STATUSES and method in IDEMPOTENT_METHODS and not last_attempt:
+                        logger.warning("%s %s returned %s, retrying", method, path, response.status)
+                    else:
+                        return ApiResponse(response.status, await read_json(response), response.headers)
+            except aiohttp.ClientConnectorError as e:
+                if last_attempt:
+                    logger.warning("%s %s failed: %s", method, path, e)
+                    return ApiResponse(None, None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if method not in IDEMPOTENT_METHODS or last_attempt:
+                    logger.warning("%s %s failed: %r", method, path, e)
+                    return ApiResponse(None, None)
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def get(self, path, conditional=False, **kwargs):
+        """GET path; with conditional=True the last response is revalidated with If-None-Match and reused on 304."""
+        if not conditional:
+            return await self.request("GET", path, **kwargs)
+        key = (path, tuple(sorted((kwargs.get("params") or {}).items())))
+        cached = self._cache.get(key)
+        if cached:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "If-None-Match": cached[0]}
+        response = await self.request("GET", path, **kwargs)
+        if response.status_code == 304 and cached:
+            self._cache.move_to_end(key)
+            return ApiResponse(200, cached[1], response.headers)
+        etag = response.headers.get("ETag")
+        if response.status_code == 200 and etag:
+            self._cache[key] = (etag, response.data)
+            self._cache.move_to_end(key)
+            while len(self._cache) > API_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return response
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request("PUT", path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request("DELETE", path, **kwargs)
+
+
+def retry_after(response):
+    try:
+        return max(float(response.headers.get("Retry-After", 1)), 1.0)
+    except ValueError:
+        return 1.0
+
+
+async def read_json(response):
+    try:
+        return await response.json(content_type=None)
+    except ValueError:
+        return None
@@ -1,18 +1,53 @@
-from flask import Flask, request, jsonify
-from models import db, ToDo, User
-import requests
+import json
+import sys
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
 
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///todos.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
+from sqlalchemy import delete, func, insert, or_, select, update
+from models import db, ToDo, User, DomainJob, WatchedDomain, DomainWatcher, DomainCheck, DomainAlert
+from storage import configure_storage
+from instrumentation import instrument_app
+from ratelimit import (configure_proxy, configure_rate_limits, domain_checks, rate_limited, too_many_requests,
+                       DOMAIN_JOB_QUEUE_MAX, SHED_RETRY_AFTER)
+from serialization import configure_json, fetch_rows, format_timestamp, rows_response
+from search import search_todos
+from http_cache import versioned
+from domain_checker import check_domains, iter_check_domains, normalize_url
+from jobs import submit_job, resume_jobs, supervise_jobs
+from monitoring import watch, unwatch, MONITOR_DEFAULT_INTERVAL, MONITOR_MIN_INTERVAL
 
-db.init_app(app)
+api = Blueprint("api", __name__)
 
-with app.app_context():
-    db.create_all()
+TODO_PAGE_SIZE = 50
+TODO_PAGE_MAX = 500
+BATCH_MAX_ITEMS = 10000
+DUPLICATE_IN_BATCH = "The same id appears more than once in the batch"
+HISTORY_PAGE_SIZE = 100
+ALERTS_PAGE_SIZE = 100
+# How long a claimed alert stays reserved for the bot process delivering it.
+ALERT_CLAIM_SECONDS = 300
+# Same keys as ToDo.to_dict() and User.to_dict(), in select order.
+TODO_COLUMNS = ("id", "description", "created_at")
+USER_COLUMNS = ("id", "telegram_id", "group", "created_at")
 
 
-@app.route("/create-todo", methods=["POST"])
+def create_app():
+    """Build the API application without touching the schema, which migrate.py keeps up to date."""
+    app = Flask(__name__)
+    configure_proxy(app)
+    configure_storage(app)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    configure_json(app)
+    db.init_app(app)
+    app.register_blueprint(api)
+    instrument_app(app, db)
+    configure_rate_limits(app)
+    return app
+
+
+@api.route("/create-todo", methods=["POST"])
 def create_todo():
     data = request.get_json()
     description = data.get("description")
@@ -24,7 +59,8 @@ def create_todo():
     return jsonify({"message": "Task has been created", "todo": todo.to_dict()}), 201
 
 
-@app.route("/get-todo", methods=["GET"])
+@api.route("/get-todo", methods=["GET"])
+@versioned(ToDo.__tablename__)
 def get_todo():
     todo_id = request.args.get("id")
     if not todo_id:
@@ -35,14 +71,91 @@ def get_todo():
     return jsonify({"todo": todo.to_dict()}), 200
 
 
-@app.route("/get-all-todo", methods=["GET"])
+@api.route("/get-all-todo", methods=["GET"])
+@versioned(ToDo.__tablename__)
 def get_all_todo():
-    todos = ToDo.query.all()
-    todos_list = [todo.to_dict() for todo in todos]
-    return jsonify({"todos": todos_list}), 200
+    try:
+        limit = min(int(request.args.get("limit", TODO_PAGE_SIZE)), TODO_PAGE_MAX)
+        after = int(request.args.get("after", 0))
+        created_from = parse_datetime(request.args.get("created_from"))
+        created_to = parse_datetime(request.args.get("created_to"))
+    except ValueError:
+        return jsonify({"error": "Invalid limit, after, created_from or created_to"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    prefix = request.args.get("prefix")
+
+    # Plain tuples with the timestamp formatted by the database; no ORM objects per row.
+    query = select(ToDo.id, ToDo.description, format_timestamp(ToDo.created_at)).where(ToDo.id > after)
+    if created_from:
+        query = query.where(ToDo.created_at >= created_from)
+    if created_to:
+        query = query.where(ToDo.created_at <= created_to)
+    if prefix and db.engine.dialect.name == "sqlite":
+        # SQLite compares text byte-wise, so a range is exactly a prefix match and can use the description index.
+        query = query.where(ToDo.description >= prefix)
+        upper_bound = prefix_upper_bound(prefix)
+        if upper_bound is not None:
+            query = query.where(ToDo.description < upper_bound)
+    elif prefix:
+        # Locale collations (PostgreSQL, MySQL _ci) do not order by code point, so a range would be wrong there.
+        # PostgreSQL only uses an index for this with a C collation or text_pattern_ops.
+        query = query.where(ToDo.description.startswith(prefix, autoescape=True))
+    rows = fetch_rows(db.session, query.order_by(ToDo.id).limit(limit + 1))
+
+    next_after = rows[limit - 1][0] if len(rows) > limit else None
+    return rows_response("todos", TODO_COLUMNS, rows[:limit], next_after=next_after)
+
+
+@api.route("/search-todo", methods=["GET"])
+def search_todo():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Search query q is required"}), 400
+    try:
+        limit = min(int(request.args.get("limit", TODO_PAGE_SIZE)), TODO_PAGE_MAX)
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "Invalid limit or offset"}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({"error": "limit must be positive and offset not negative"}), 400
+    todos = search_todos(query, limit + 1, offset)
+    next_offset = offset + limit if len(todos) > limit else None
+    todos_list = [todo.to_dict() for todo in todos[:limit]]
+    return jsonify({"todos": todos_list, "next_offset": next_offset}), 200
+
+
+def parse_datetime(value):
+    if not value:
+        return None
+    for fmt in ("%d-%m-%Y %H:%M:%S", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return datetime.fromisoformat(value)
+
 
+def prefix_upper_bound(prefix):
+    """The smallest string above every string starting with prefix, or None if there is none (all U+10FFFF)."""
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    # Surrogates cannot be encoded, and no stored text contains them.
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return prefix[:-1] + chr(code)
 
-@app.route("/update-todo", methods=["PUT", "PATCH"])
+
+def parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@api.route("/update-todo", methods=["PUT", "PATCH"])
 def update_todo():
     data = request.get_json()
     todo_id = data.get("id")
@@ -57,7 +170,7 @@ def update_todo():
     return jsonify({"message": "Task has been updated", "todo": todo.to_dict()}), 200
 
 
-@app.route("/delete-todo", methods=["DELETE"])
+@api.route("/delete-todo", methods=["DELETE"])
 def delete_todo():
     data = request.get_json()
     todo_id = data.get("id")
@@ -71,7 +184,7 @@ def delete_todo():
     return jsonify({"message": "Task has been deleted"}), 200
 
 
-@app.route('/delete-all-todo', methods=['DELETE'])
+@api.route('/delete-all-todo', methods=['DELETE'])
 def delete_all_todo():
     try:
         num_deleted = db.session.query(ToDo).delete()
@@ -81,14 +194,102 @@ def delete_all_todo():
         db.session.rollback()
         return jsonify({"error": f"Failed to delete tasks: {str(e)}"}), 500
 
-@app.route("/get-users", methods=["GET"])
+@api.route("/batch-todo", methods=["POST"])
+def batch_todo():
+    data = request.get_json()
+    creates = data.get("create", [])
+    updates = data.get("update", [])
+    deletes = data.get("delete", [])
+    if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+        return jsonify({"error": "create, update and delete must be lists"}), 400
+    if len(creates) + len(updates) + len(deletes) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"A batch can hold at most {BATCH_MAX_ITEMS} items"}), 400
+
+    results = {"create": [], "update": [], "delete": []}
+    new_rows, new_indexes = [], []
+    for index, item in enumerate(creates):
+        description = item.get("description") if isinstance(item, dict) else None
+        if not description:
+            results["create"].append({"index": index, "status": 400, "error": "Task description is required"})
+            continue
+        new_rows.append({"description": description})
+        new_indexes.append(index)
+
+    update_ids = [parse_id(item.get("id")) if isinstance(item, dict) else None for item in updates]
+    delete_ids = [parse_id(item.get("id") if isinstance(item, dict) else item) for item in deletes]
+    referenced = {todo_id for todo_id in update_ids + delete_ids if todo_id is not None}
+    existing = set(db.session.scalars(select(ToDo.id).where(ToDo.id.in_(referenced)))) if referenced else set()
+    # A task changed twice in one batch has no single outcome, so every item naming it is refused.
+    repeated = {todo_id for todo_id, count in Counter(update_ids + delete_ids).items() if count > 1}
+
+    changed_rows = {}
+    for index, (todo_id, item) in enumerate(zip(update_ids, updates)):
+        description = item.get("description") if isinstance(item, dict) else None
+        if todo_id is None or not description:
+            results["update"].append({"index": index, "status": 400,
+                                      "error": "You need to set id and fill in with new description"})
+        elif todo_id in repeated:
+            results["update"].append({"index": index, "status": 409, "error": DUPLICATE_IN_BATCH})
+        elif todo_id not in existing:
+            results["update"].append({"index": index, "status": 404, "error": "Not found"})
+        else:
+            changed_rows[todo_id] = {"id": todo_id, "description": description}
+            results["update"].append({"index": index, "status": 200, "id": todo_id})
+
+    removed_ids = set()
+    for index, todo_id in enumerate(delete_ids):
+        if todo_id is None:
+            results["delete"].append({"index": index, "status": 400, "error": "Specifying of id is required"})
+        elif todo_id in repeated:
+            results["delete"].append({"index": index, "status": 409, "error": DUPLICATE_IN_BATCH})
+        elif todo_id not in existing:
+            results["delete"].append({"index": index, "status": 404, "error": "Not Found"})
+        else:
+            removed_ids.add(todo_id)
+            results["delete"].append({"index": index, "status": 200, "id": todo_id})
+
+    try:
+        if new_rows:
+            created = db.session.scalars(
+                insert(ToDo).returning(ToDo, sort_by_parameter_order=True), new_rows
+            ).all()
+            for index, todo in zip(new_indexes, created):
+                results["create"].append({"index": index, "status": 201, "todo": todo.to_dict()})
+            results["create"].sort(key=lambda result: result["index"])
+        if changed_rows:
+            db.session.execute(update(ToDo), list(changed_rows.values()))
+        if removed_ids:
+            db.session.execute(delete(ToDo).where(ToDo.id.in_(removed_ids)))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to apply batch: {str(e)}"}), 500
+
+    if changed_rows:
+        todos = {todo.id: todo for todo in ToDo.query.filter(ToDo.id.in_(changed_rows))}
+        for result in results["update"]:
+            if result["status"] == 200 and result["id"] in todos:
+                result["todo"] = todos[result["id"]].to_dict()
+    return jsonify(results), 200
+
+
+@api.route("/get-users", methods=["GET"])
+@versioned(User.__tablename__)
 def get_users():
-    users = User.query.all()
-    users_list = [user.to_dict() for user in users]
-    return jsonify({"users": users_list}), 200
+    query = select(User.id, User.telegram_id, User.group, format_timestamp(User.created_at))
+    try:
+        updated_since = parse_datetime(request.args.get("updated_since"))
+    except ValueError:
+        return jsonify({"error": "Invalid updated_since"}), 400
+    if updated_since:
+        query = query.where(User.updated_at >= updated_since)
+    # Overlap the next window by a second so rows committed while this query runs are not missed.
+    synced_at = datetime.utcnow() - timedelta(seconds=1)
+    rows = fetch_rows(db.session, query)
+    return rows_response("users", USER_COLUMNS, rows, synced_at=synced_at.isoformat())
 
 
-@app.route("/add-user", methods=["POST"])
+@api.route("/add-user", methods=["POST"])
 def add_user():
     data = request.get_json()
     telegram_id = data.get("telegram_id")
@@ -103,7 +304,7 @@ def add_user():
     return jsonify({"message": "User added successfully", "user": new_user.to_dict()}), 201
 
 
-@app.route("/delete-user", methods=["DELETE"])
+@api.route("/delete-user", methods=["DELETE"])
 def delete_user():
     data = request.get_json()
     telegram_id = data.get("telegram_id")
@@ -117,7 +318,7 @@ def delete_user():
     return jsonify({"message": "User deleted successfully"}), 200
 
 
-@app.route("/edit-user", methods=["PUT", "PATCH"])
+@api.route("/edit-user", methods=["PUT", "PATCH"])
 def edit_user():
     data = request.get_json()
     telegram_id = data.get("telegram_id")
@@ -132,40 +333,255 @@ def edit_user():
     return jsonify({"message": "User updated successfully", "user": user.to_dict()}), 200
 
 
-def check_domain(domain):
-    if not domain.startswith("http"):
-        domain = "https://" + domain
-    try:
-        response = requests.get(domain, timeout=5)
-        status = response.status_code
-        ssl_ok = "OK"
-        availability = "available" if status == 200 else "not available"
-    except requests.exceptions.SSLError:
-        ssl_ok = "Failed"
-        status = "N/A"
-        availability = "not available"
-    except Exception:
-        ssl_ok = "Error"
-        status = "N/A"
-        availability = "not available"
-    return {"domain": domain, "ssl": ssl_ok, "status": status, "availability": availability}
-
-
-@app.route("/search-domains", methods=["POST"])
-def search_domains():
+@api.route("/batch-users", methods=["POST"])
+def batch_users():
     data = request.get_json()
+    upserts = data.get("upsert", [])
+    deletes = data.get("delete", [])
+    if not isinstance(upserts, list) or not isinstance(deletes, list):
+        return jsonify({"error": "upsert and delete must be lists"}), 400
+    if len(upserts) + len(deletes) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"A batch can hold at most {BATCH_MAX_ITEMS} items"}), 400
+
+    results = {"upsert": [], "delete": []}
+    upsert_items = [(str(item.get("telegram_id") or ""), item.get("group")) if isinstance(item, dict) else ("", None)
+                    for item in upserts]
+    delete_ids = [str((item.get("telegram_id") if isinstance(item, dict) else item) or "") for item in deletes]
+    referenced = {telegram_id for telegram_id, _ in upsert_items} | set(delete_ids)
+    referenced.discard("")
+    existing = dict(db.session.execute(
+        select(User.telegram_id, User.id).where(User.telegram_id.in_(referenced))
+    ).all()) if referenced else {}
+    repeated = {telegram_id for telegram_id, count in
+                Counter([telegram_id for telegram_id, _ in upsert_items] + delete_ids).items() if count > 1}
+
+    new_users, changed_users = {}, {}
+    for index, (telegram_id, group) in enumerate(upsert_items):
+        if not telegram_id or not group:
+            results["upsert"].append({"index": index, "status": 400, "error": "telegram_id and group are required"})
+        elif telegram_id in repeated:
+            results["upsert"].append({"index": index, "status": 409, "error": DUPLICATE_IN_BATCH})
+        elif telegram_id in existing:
+            changed_users[telegram_id] = {"id": existing[telegram_id], "group": group}
+            results["upsert"].append({"index": index, "status": 200, "telegram_id": telegram_id})
+        else:
+            new_users[telegram_id] = {"telegram_id": telegram_id, "group": group}
+            results["upsert"].append({"index": index, "status": 201, "telegram_id": telegram_id})
+
+    removed_ids = set()
+    for index, telegram_id in enumerate(delete_ids):
+        if not telegram_id:
+            results["delete"].append({"index": index, "status": 400, "error": "telegram_id is required"})
+        elif telegram_id in repeated:
+            results["delete"].append({"index": index, "status": 409, "error": DUPLICATE_IN_BATCH})
+        elif telegram_id not in existing:
+            results["delete"].append({"index": index, "status": 404, "error": "User not found"})
+        else:
+            removed_ids.add(existing[telegram_id])
+            results["delete"].append({"index": index, "status": 200, "telegram_id": telegram_id})
+
+    try:
+        if new_users:
+            db.session.execute(insert(User), list(new_users.values()))
+        if changed_users:
+            db.session.execute(update(User), list(changed_users.values()))
+        if removed_ids:
+            db.session.execute(delete(User).where(User.id.in_(removed_ids)))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to apply batch: {str(e)}"}), 500
+
+    touched = set(new_users) | set(changed_users)
+    if touched:
+        users = {user.telegram_id: user for user in User.query.filter(User.telegram_id.in_(touched))}
+        for result in results["upsert"]:
+            if result["status"] in (200, 201) and result["telegram_id"] in users:
+                result["user"] = users[result["telegram_id"]].to_dict()
+    return jsonify(results), 200
+
+
+def parse_domains(data):
     domains_input = data.get("domains")
     if not domains_input:
-        return jsonify({"error": "No domains provided"}), 400
+        return None, "No domains provided"
     if isinstance(domains_input, str):
-        domains = [d.strip() for d in domains_input.splitlines() if d.strip()]
-    elif isinstance(domains_input, list):
-        domains = domains_input
-    else:
-        return jsonify({"error": "Invalid input format"}), 400
-    results = [check_domain(d) for d in domains]
+        return [d.strip() for d in domains_input.splitlines() if d.strip()], None
+    if isinstance(domains_input, list):
+        return domains_input, None
+    return None, "Invalid input format"
+
+
+def domain_count():
+    """Tokens a domain check request takes from the domains budget: one per domain."""
+    domains, _ = parse_domains(request.get_json(silent=True) or {})
+    return max(len(domains or ()), 1)
+
+
+@api.route("/search-domains", methods=["POST"])
+@rate_limited("domains", domain_count)
+def search_domains():
+    domains, error = parse_domains(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    if not domain_checks.acquire(len(domains)):
+        return too_many_requests("domain_checks_inflight", SHED_RETRY_AFTER, "Too many domain checks in progress")
+    if wants_stream():
+        # Tell buffering proxies (nginx) to pass each line through as soon as it is written.
+        response = Response(stream_domain_results(domains), mimetype="application/x-ndjson",
+                            headers={"X-Accel-Buffering": "no"})
+        # Runs when the server is done with the response, even if the client went away before the first line.
+        response.call_on_close(lambda: domain_checks.release(len(domains)))
+        return response
+    try:
+        results = check_domains(domains)
+    finally:
+        domain_checks.release(len(domains))
     return jsonify({"results": results}), 200
 
 
+@api.route("/submit-domain-job", methods=["POST"])
+@rate_limited("domains", domain_count)
+def submit_domain_job():
+    domains, error = parse_domains(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    queued = db.session.scalar(select(func.count()).select_from(DomainJob).where(DomainJob.status == "queued"))
+    if queued >= DOMAIN_JOB_QUEUE_MAX:
+        return too_many_requests("domain_job_queue", SHED_RETRY_AFTER, "Too many domain jobs are waiting")
+    job = submit_job(current_app._get_current_object(), domains)
+    return jsonify({"message": "Job has been submitted", "job": job.to_dict(with_results=False)}), 202
+
+
+@api.route("/get-domain-job", methods=["GET"])
+def get_domain_job():
+    job_id = request.args.get("id")
+    if not job_id:
+        return jsonify({"error": "Specifying of id is required"}), 400
+    job = db.session.get(DomainJob, job_id)
+    if not job:
+        return jsonify({"error": "Not found"}), 404
+    with_results = request.args.get("results", "1").lower() not in ("0", "false", "no")
+    return jsonify({"job": job.to_dict(with_results=with_results)}), 200
+
+
+@api.route("/watch-domain", methods=["POST"])
+def watch_domain():
+    data = request.get_json()
+    domains, error = parse_domains(data)
+    if error:
+        return jsonify({"error": error}), 400
+    chat_id = data.get("chat_id")
+    if not chat_id:
+        return jsonify({"error": "chat_id is required"}), 400
+    try:
+        interval = max(int(data.get("interval", MONITOR_DEFAULT_INTERVAL)), MONITOR_MIN_INTERVAL)
+    except (TypeError, ValueError):
+        return jsonify({"error": "interval must be a number of seconds"}), 400
+    watched = watch(list(dict.fromkeys(normalize_url(d) for d in domains)), str(chat_id), interval)
+    return jsonify({"message": "Domains are being watched", "watched": [w.to_dict() for w in watched]}), 201
+
+
+@api.route("/unwatch-domain", methods=["DELETE"])
+def unwatch_domain():
+    data = request.get_json()
+    domains, error = parse_domains(data)
+    if error:
+        return jsonify({"error": error}), 400
+    chat_id = data.get("chat_id")
+    if not chat_id:
+        return jsonify({"error": "chat_id is required"}), 400
+    removed = unwatch([normalize_url(d) for d in domains], str(chat_id))
+    if not removed:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"message": f"Stopped watching {removed} domains."}), 200
+
+
+@api.route("/get-watched-domains", methods=["GET"])
+def get_watched_domains():
+    query = WatchedDomain.query
+    chat_id = request.args.get("chat_id")
+    if chat_id:
+        query = query.join(DomainWatcher).filter(DomainWatcher.chat_id == chat_id)
+    watched = query.order_by(WatchedDomain.id).all()
+    return jsonify({"watched": [w.to_dict() for w in watched]}), 200
+
+
+@api.route("/get-domain-history", methods=["GET"])
+def get_domain_history():
+    domain = request.args.get("domain")
+    if not domain:
+        return jsonify({"error": "Specifying of domain is required"}), 400
+    watched = WatchedDomain.query.filter_by(domain=normalize_url(domain)).first()
+    if not watched:
+        return jsonify({"error": "Not found"}), 404
+    try:
+        limit = min(int(request.args.get("limit", HISTORY_PAGE_SIZE)), TODO_PAGE_MAX)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    checks = (DomainCheck.query.filter_by(watched_domain_id=watched.id)
+              .order_by(DomainCheck.checked_at.desc()).limit(limit))
+    return jsonify({"domain": watched.to_dict(), "history": [check.to_dict() for check in checks]}), 200
+
+
+@api.route("/get-domain-alerts", methods=["GET"])
+def get_domain_alerts():
+    alerts = (DomainAlert.query.filter(DomainAlert.delivered_at.is_(None))
+              .order_by(DomainAlert.id).limit(ALERTS_PAGE_SIZE))
+    return jsonify({"alerts": [alert.to_dict() for alert in alerts]}), 200
+
+
+@api.route("/claim-domain-alerts", methods=["POST"])
+def claim_domain_alerts():
+    """Reserve a page of undelivered alerts for the caller, so each alert is sent by one bot process only."""
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    claimable = (select(DomainAlert.id)
+                 .where(DomainAlert.delivered_at.is_(None),
+                        or_(DomainAlert.claimed_until.is_(None), DomainAlert.claimed_until < now))
+                 .order_by(DomainAlert.id).limit(ALERTS_PAGE_SIZE))
+    # The claim conditions are repeated on the UPDATE itself, so two callers can never take the same row.
+    db.session.execute(
+        update(DomainAlert)
+        .where(DomainAlert.id.in_(claimable.scalar_subquery()), DomainAlert.delivered_at.is_(None),
+               or_(DomainAlert.claimed_until.is_(None), DomainAlert.claimed_until < now))
+        .values(claim_token=token, claimed_until=now + timedelta(seconds=ALERT_CLAIM_SECONDS)),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+    alerts = DomainAlert.query.filter_by(claim_token=token).order_by(DomainAlert.id)
+    return jsonify({"alerts": [alert.to_dict() for alert in alerts]}), 200
+
+
+@api.route("/ack-domain-alerts", methods=["POST"])
+def ack_domain_alerts():
+    ids = [alert_id for alert_id in map(parse_id, request.get_json().get("ids") or []) if alert_id is not None]
+    if not ids:
+        return jsonify({"error": "ids are required"}), 400
+    acked = db.session.execute(
+        update(DomainAlert).where(DomainAlert.id.in_(ids)).values(delivered_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return jsonify({"message": f"Acknowledged {acked} alerts."}), 200
+
+
+def wants_stream():
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+
+def stream_domain_results(domains):
+    for index, result in iter_check_domains(domains):
+        yield json.dumps({"index": index, **result}) + "\n"
+
+
 if __name__ == "__main__":
+    from migrate import migrate
+
+    app = create_app()
+    migrate(app)
+    with app.app_context():
+        resume_jobs(app)
+    supervise_jobs(app)
     app.run(host="0.0.0.0", port=5001)
@@ -0,0 +1,169 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from benchmarks import stand_in
+from benchmarks.common import add_common_arguments, measure, print_table, write_results
+
+DOMAINS_PER_REQUEST = 10
+
+
+def build_cases(app, client, args, server, rng):
+    """Return (name, call, requests) for every endpoint; a requests of None means args.requests."""
+    from sqlalchemy import insert
+
+    from models import db, DomainAlert, DomainCheck
+    from monitoring import watch
+
+    todos, users = args.todos, args.users
+    domain_url = server.base_url + "/{delay}/200?n={n}"
+
+    def todo_id():
+        return rng.randint(1, todos)
+
+    def telegram_id():
+        return str(100000000 + rng.randrange(users))
+
+    def expect(response, *statuses):
+        return response.status_code in statuses
+
+    def domains(index):
+        return [domain_url.format(delay=rng.choice((0, 5, 20)), n=f"{index}-{i}") for i in range(DOMAINS_PER_REQUEST)]
+
+    with app.app_context():
+        watched = watch([f"{server.base_url}/watched-{i}" for i in range(20)], "1", 300)
+        now = datetime.utcnow()
+        db.session.execute(insert(DomainCheck), [
+            {"watched_domain_id": w.id, "checked_at": now - timedelta(minutes=i), "ssl": "OK", "status": 200,
+             "available": True}
+            for w in watched for i in range(200)
+        ])
+        db.session.execute(insert(DomainAlert), [
+            {"chat_id": "1", "text": f"alert {i}", "created_at": now} for i in range(args.requests)
+        ])
+        db.session.commit()
+        history_domain = watched[0].domain
+
+    etag = client().get("/get-all-todo").headers["ETag"]
+    job_ids = []
+    deleted_todo = iter(range(1, todos + 1))
+    deleted_user = iter(range(users))
+
+    def submit_job(index):
+        response = client().post("/submit-domain-job", json={"domains": domains(index)})
+        job_ids.append(response.get_json()["job"]["id"])
+        return expect(response, 202)
+
+    return [
+        # Reads first so they run against the seeded sizes.
+        ("get-todo", lambda i: expect(client().get("/get-todo", query_string={"id": todo_id()}), 200), None),
+        ("get-all-todo first page", lambda i: expect(client().get("/get-all-todo"), 200), None),
+        ("get-all-todo deep page", lambda i: expect(
+            client().get("/get-all-todo", query_string={"after": todo_id()}), 200), None),
+        ("get-all-todo prefix", lambda i: expect(
+            client().get("/get-all-todo", query_string={"prefix": rng.choice(("buy", "fix", "plan"))}), 200), None),
+        ("get-all-todo 304", lambda i: expect(client().get("/get-all-todo", headers={"If-None-Match": etag}), 304),
+         None),
+        ("search-todo", lambda i: expect(
+            client().get("/search-todo", query_string={"q": rng.choice(("milk", "fix bug", "rev", "team"))}), 200),
+         None),
+        ("get-users", lambda i: expect(client().get("/get-users"), 200), max(10, args.requests // 10)),
+        ("get-watched-domains", lambda i: expect(client().get("/get-watched-domains"), 200), None),
+        ("get-domain-history", lambda i: expect(
+            client().get("/get-domain-history", query_string={"domain": history_domain}), 200), None),
+        ("get-domain-alerts", lambda i: expect(client().get("/get-domain-alerts"), 200), None),
+        # Writes.
+        ("create-todo", lambda i: expect(client().post("/create-todo", json={"description": f"bench {i}"}), 201),
+         None),
+        ("update-todo", lambda i: expect(
+            client().put("/update-todo", json={"id": todo_id(), "description": f"updated {i}"}), 200), None),
+        ("batch-todo 100 creates", lambda i: expect(
+            client().post("/batch-todo", json={"create": [{"description": f"batch {i} {j}"} for j in range(100)]}),
+            200), max(10, args.requests // 10)),
+        ("add-user", lambda i: expect(
+            client().post("/add-user", json={"telegram_id": str(900000000 + i), "group": "user"}), 201), None),
+        ("edit-user", lambda i: expect(
+            client().put("/edit-user", json={"telegram_id": telegram_id(), "group": "manager"}), 200), None),
+        ("batch-users 100 upserts", lambda i: expect(
+            client().post("/batch-users", json={"upsert": [{"telegram_id": str(800000000 + i * 100 + j),
+                                                            "group": "user"} for j in range(100)]}), 200),
+         max(10, args.requests // 10)),
+        ("ack-domain-alerts", lambda i: expect(client().post("/ack-domain-alerts", json={"ids": [i + 1]}), 200),
+         None),
+        ("watch-domain", lambda i: expect(
+            client().post("/watch-domain", json={"domains": [f"{server.base_url}/w-{i}"], "chat_id": "2"}), 201),
+         None),
+        ("unwatch-domain", lambda i: expect(
+            client().delete("/unwatch-domain", json={"domains": [f"{server.base_url}/w-{i}"], "chat_id": "2"}), 200),
+         None),
+        # Domain checks against the stand-in server; unique URLs keep the result cache out of it.
+        (f"search-domains {DOMAINS_PER_REQUEST} domains", lambda i: expect(
+            client().post("/search-domains", json={"domains": domains(i)}), 200), max(10, args.requests // 10)),
+        (f"search-domains {DOMAINS_PER_REQUEST} cached", lambda i: expect(
+            client().post("/search-domains", json={"domains": domains(0)}), 200), max(10, args.requests // 10)),
+        ("submit-domain-job", submit_job, max(10, args.requests // 10)),
+        ("get-domain-job", lambda i: expect(
+            client().get("/get-domain-job", query_string={"id": job_ids[i % len(job_ids)]}), 200), None),
+        # Deletes last.
+        ("delete-todo", lambda i: expect(client().delete("/delete-todo", json={"id": next(deleted_todo)}), 200),
+         min(args.requests, todos)),
+        ("delete-user", lambda i: expect(
+            client().delete("/delete-user", json={"telegram_id": str(100000000 + next(deleted_user))}), 200),
+         min(args.requests, users)),
+        ("delete-all-todo", lambda i: expect(client().delete("/delete-all-todo"), 200), 1),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every API endpoint against a seeded database.")
+    add_common_arguments(parser)
+    parser.add_argument("--todos", type=int, default=10000, help="ToDo rows to seed (1k-1M)")
+    parser.add_argument("--users", type=int, default=1000, help="User rows to seed")
+    parser.add_argument("--database", help="database URL (default: a temporary SQLite file)")
+    parser.add_argument("--only", nargs="*", help="run only cases whose name starts with one of these")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="todoplash-bench-")
+    # storage.py reads DATABASE_URL at import time, so it has to be set before the app is imported.
+    os.environ["DATABASE_URL"] = args.database or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    # Every case comes from one client; the limits would measure 429s instead of the handlers.
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    from app import create_app
+    from benchmarks.seed import seed
+    from migrate import migrate
+
+    app = create_app()
+    migrate(app)
+    with app.app_context():
+        seed_time = seed(args.todos, args.users, args.seed)
+    print(f"Seeded {args.todos} todos and {args.users} users in {seed_time:.1f}s")
+
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        return local.client
+
+    server = stand_in.start()
+    results = {}
+    for name, call, requests in build_cases(app, client, args, server, random.Random(args.seed)):
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        results[name] = measure(call, requests or args.requests, args.concurrency)
+        print(f"{name}: p50 {results[name]['p50_ms']} ms, p99 {results[name]['p99_ms']} ms")
+    server.shutdown()
+
+    params = {"todos": args.todos, "users": args.users, "requests": args.requests,
+              "concurrency": args.concurrency, "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+              "seed_time_s": round(seed_time, 2)}
+    print_table(results)
+    write_results("api", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.common import measure_async, print_table, summarize, write_results
+
+BOT_USER_ID = 42
+FLOWS = {
+    "start": ["/start"],
+    "create task": ["➕ Create Task", "benchmark task {chat}"],
+    "list tasks": ["📋 List Tasks"],
+    "get task": ["🔍 Get Task by ID", "{todo_id}"],
+    "search tasks": ["🔦 Search Tasks", "milk"],
+}
+
+
+def fake_session_class():
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import EditMessageText, SendMessage
+    from aiogram.types import Chat, Message
+
+    class FakeSession(BaseSession):
+        """Telegram transport that answers every method locally after a fixed latency."""
+
+        def __init__(self, latency=0.0):
+            super().__init__()
+            self.latency = latency
+            self.calls = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            self.calls += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if isinstance(method, (SendMessage, EditMessageText)):
+                chat = Chat(id=method.chat_id or 0, type="private")
+                return Message(message_id=self.calls, date=datetime.now(), chat=chat, text=method.text)
+            return True
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            # The flows never download files, so there is never anything to stream.
+            for chunk in ():
+                yield chunk
+
+        async def close(self):
+            pass
+
+    return FakeSession
+
+
+def start_api(todos, users):
+    """Serve the API from a freshly seeded database on a free local port in a background thread."""
+    from werkzeug.serving import make_server
+
+    from app import create_app
+    from benchmarks.seed import seed
+    from migrate import migrate
+
+    app = create_app()
+    migrate(app)
+    with app.app_context():
+        seed(todos, users)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def message_update(update_id, chat_id, text):
+    from aiogram.types import Update
+
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": int(time.time()), "text": text,
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}},
+    })
+
+
+async def run(args):
+    import bot as bot_module
+
+    # bot.py configures INFO logging; per-update and per-request lines would drown the results.
+    for name in ("aiogram.event", "werkzeug"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    session = fake_session_class()(args.telegram_latency_ms / 1000)
+    bot_module.bot.session = session
+    bot, dp = bot_module.bot, bot_module.dp
+    update_ids = iter(range(1, 10 ** 9))
+    results = {}
+
+    for name, steps in FLOWS.items():
+        update_latencies = []
+
+        async def flow(index):
+            chat_id = 1000 + index % args.chats
+            for step in steps:
+                text = step.format(chat=chat_id, todo_id=1 + index % args.todos)
+                started = time.perf_counter()
+                await dp.feed_update(bot, message_update(next(update_ids), chat_id, text))
+                update_latencies.append(time.perf_counter() - started)
+
+        flow_summary = await measure_async(flow, args.flows, args.chats)
+        results[f"{name} flow"] = flow_summary
+        results[f"{name} update"] = summarize(update_latencies, 0, flow_summary["elapsed_s"])
+
+    await bot_module.api.close()
+    await dp.storage.close()
+    return results, session.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bot handlers under concurrent chats.")
+    parser.add_argument("--chats", type=int, default=50, help="chats talking to the bot at once")
+    parser.add_argument("--flows", type=int, default=500, help="runs of every flow")
+    parser.add_argument("--todos", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--telegram-latency-ms", type=float, default=0.0, help="simulated Telegram API latency")
+    parser.add_argument("--output", help="JSON file for the results (default: benchmarks/results/bot.json)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="todoplash-bench-")
+    # Both storage.py and bot.py read their settings from the environment at import time.
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["FSM_DB_PATH"] = os.path.join(workdir, "fsm.db")
+    os.environ.setdefault("BOT_TOKEN", f"{BOT_USER_ID}:benchmark")
+    # Flows replay far faster than a person types; the per-user limits would answer most of them.
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    server = start_api(args.todos, args.users)
+    os.environ["API_URL"] = f"http://127.0.0.1:{server.server_port}"
+    results, telegram_calls = asyncio.run(run(args))
+    server.shutdown()
+    params = {"chats": args.chats, "flows": args.flows, "todos": args.todos,
+              "telegram_latency_ms": args.telegram_latency_ms, "telegram_calls": telegram_calls,
+              "fsm_storage": os.getenv("FSM_STORAGE", "sqlite")}
+    print_table(results)
+    write_results("bot", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of already sorted values."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    """Latency percentiles in milliseconds and throughput of one benchmark case."""
+    latencies = sorted(latencies)
+    count = len(latencies) + errors
+    summary = {"requests": count, "errors": errors, "elapsed_s": round(elapsed, 3),
+               "throughput_rps": round(count / elapsed, 1) if elapsed else None}
+    for name, fraction in (("p50_ms", 0.5), ("p90_ms", 0.9), ("p99_ms", 0.99)):
+        value = percentile(latencies, fraction)
+        summary[name] = round(value * 1000, 3) if value is not None else None
+    summary["max_ms"] = round(latencies[-1] * 1000, 3) if latencies else None
+    summary["mean_ms"] = round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None
+    return summary
+
+
+def measure(call, requests, concurrency):
+    """Run call(index) requests times from concurrency threads.
+
+    A call that returns False or raises counts as an error and is left out of the latencies.
+    """
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            started = time.perf_counter()
+            try:
+                ok = call(index) is not False
+            except Exception:
+                ok = False
+            duration = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(duration)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+async def measure_async(call, requests, concurrency):
+    """Async counterpart of measure(): call(index) is awaited from concurrency tasks."""
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                ok = await call(index) is not False
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(suite, params, results, output=None):
+    """Write results with enough context (revision, machine, parameters) to compare runs later."""
+    output = output or os.path.join(RESULTS_DIR, f"{suite}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    report = {
+        "suite": suite,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {output}")
+    return report
+
+
+def print_table(results):
+    print(f"{'case':<40} {'req':>7} {'err':>5} {'p50 ms':>9} {'p99 ms':>9} {'rps':>9}")
+    for name, result in results.items():
+        print(f"{name:<40} {result['requests']:>7} {result['errors']:>5} {result['p50_ms'] or '-':>9} "
+              f"{result['p99_ms'] or '-':>9} {result['throughput_rps'] or '-':>9}")
+
+
+def add_common_arguments(parser, requests=1000, concurrency=8):
+    parser.add_argument("--requests", type=int, default=requests, help="requests per case")
+    parser.add_argument("--concurrency", type=int, default=concurrency, help="concurrent clients")
+    parser.add_argument("--output", help="JSON file for the results (default: benchmarks/results/<suite>.json)")
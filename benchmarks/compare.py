@@ -0,0 +1,48 @@
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p99_ms", "throughput_rps")
+
+
+def compare(baseline, current, threshold):
+    """Return (case, metric, before, after, change) for every metric that got worse by more than threshold."""
+    regressions = []
+    for case, before in baseline["results"].items():
+        after = current["results"].get(case)
+        if after is None:
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), after.get(metric)
+            if not old or new is None:
+                continue
+            # Latencies regress when they grow, throughput when it drops.
+            change = (new - old) / old if metric != "throughput_rps" else (old - new) / old
+            if change > threshold:
+                regressions.append((case, metric, old, new, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files and flag regressions.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative slowdown (default 10%%)")
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline.get("params") != current.get("params"):
+        print("Warning: the runs used different parameters, the comparison may be meaningless.")
+
+    regressions = compare(baseline, current, args.threshold)
+    for case, metric, old, new, change in regressions:
+        print(f"{case}: {metric} {old} -> {new} ({change:+.0%} worse)")
+    if not regressions:
+        print(f"No regressions above {args.threshold:.0%}.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
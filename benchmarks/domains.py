@@ -0,0 +1,74 @@
+import argparse
+import time
+
+from benchmarks import stand_in
+from benchmarks.common import add_common_arguments, measure, print_table, summarize, write_results
+
+
+def start_servers(hosts, latency_ms, failure_rate, seed):
+    # Extra hosts listen on 127.0.0.2, 127.0.0.3, ... so the per-host cap applies to each separately (Linux).
+    return [stand_in.start(f"127.0.0.{i + 1}", latency_ms=latency_ms, failure_rate=failure_rate, seed=seed + i)
+            for i in range(hosts)]
+
+
+def batch_case(check_domains, result_cache, urls, repeat, use_cache):
+    """Time check_domains over the same URLs repeat times; per-domain ttfb goes into the latencies."""
+    walls, ttfbs, errors = [], [], 0
+    for _ in range(repeat):
+        if not use_cache:
+            result_cache.clear()
+        started = time.perf_counter()
+        results = check_domains(urls, use_cache=use_cache)
+        walls.append(time.perf_counter() - started)
+        for result in results:
+            if result["availability"] != "available":
+                errors += 1
+            elif not result["cached"] and result["timings"]["ttfb_ms"] is not None:
+                ttfbs.append(result["timings"]["ttfb_ms"] / 1000)
+    summary = summarize(ttfbs, errors, sum(walls))
+    summary["requests"] = len(urls) * repeat
+    summary["throughput_rps"] = round(len(urls) * repeat / sum(walls), 1)
+    summary["wall_p50_ms"] = round(sorted(walls)[len(walls) // 2] * 1000, 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark check_domain/check_domains against stand-in servers.")
+    add_common_arguments(parser, requests=200, concurrency=8)
+    parser.add_argument("--hosts", type=int, default=1, help="stand-in servers on 127.0.0.1..N")
+    parser.add_argument("--latency-ms", type=float, nargs=2, default=(5, 50), metavar=("MIN", "MAX"))
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per batch size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from domain_checker import check_domain, check_domains, result_cache
+
+    servers = start_servers(args.hosts, tuple(args.latency_ms), args.failure_rate, args.seed)
+    results = {}
+
+    for delay_ms in (0, 50):
+        url = f"{servers[0].base_url}/{delay_ms}/200"
+        results[f"check_domain {delay_ms} ms"] = measure(
+            lambda i: check_domain(url)["availability"] == "available", args.requests, args.concurrency)
+    for status in ("500", "reset"):
+        url = f"{servers[0].base_url}/0/{status}"
+        results[f"check_domain {status}"] = measure(lambda i: check_domain(url), args.requests, args.concurrency)
+
+    for size in args.batch_sizes:
+        urls = [f"{servers[i % len(servers)].base_url}/d{i}" for i in range(size)]
+        results[f"check_domains {size}"] = batch_case(check_domains, result_cache, urls, args.repeat, False)
+        results[f"check_domains {size} cached"] = batch_case(check_domains, result_cache, urls, args.repeat, True)
+
+    for server in servers:
+        server.shutdown()
+    params = {"requests": args.requests, "concurrency": args.concurrency, "hosts": args.hosts,
+              "latency_ms": list(args.latency_ms), "failure_rate": args.failure_rate,
+              "batch_sizes": args.batch_sizes, "repeat": args.repeat}
+    print_table(results)
+    write_results("domains", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
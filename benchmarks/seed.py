@@ -0,0 +1,69 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert
+
+from models import db, ToDo, User
+
+WORDS = ("buy", "milk", "call", "mom", "fix", "bug", "deploy", "release", "write", "report", "review", "code",
+         "book", "flight", "pay", "rent", "clean", "kitchen", "plan", "sprint", "update", "docs", "meet", "team")
+GROUPS = ("user", "user", "user", "manager", "admin")
+SEED_BATCH = 10000
+
+
+def todo_rows(count, rng, start):
+    for i in range(count):
+        description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+        yield {"description": f"{description} #{i}", "created_at": start + timedelta(seconds=i)}
+
+
+def user_rows(count, rng):
+    for i in range(count):
+        yield {"telegram_id": str(100000000 + i), "group": rng.choice(GROUPS)}
+
+
+def insert_batched(model, rows, batch=SEED_BATCH):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == batch:
+            db.session.execute(insert(model), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(model), chunk)
+    db.session.commit()
+
+
+def seed(todos, users, seed_value=0, replace=True):
+    """Fill the ToDo and User tables with deterministic rows; call inside an app context."""
+    rng = random.Random(seed_value)
+    if replace:
+        db.session.execute(delete(ToDo))
+        db.session.execute(delete(User))
+        db.session.commit()
+    started = time.perf_counter()
+    insert_batched(ToDo, todo_rows(todos, rng, datetime(2024, 1, 1)))
+    insert_batched(User, user_rows(users, rng))
+    return time.perf_counter() - started
+
+
+def main():
+    from app import create_app
+    from migrate import migrate
+
+    parser = argparse.ArgumentParser(description="Seed the database in DATABASE_URL with benchmark data.")
+    parser.add_argument("--todos", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    app = create_app()
+    migrate(app)
+    with app.app_context():
+        elapsed = seed(args.todos, args.users, args.seed)
+    print(f"Seeded {args.todos} todos and {args.users} users in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
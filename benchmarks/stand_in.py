@@ -0,0 +1,97 @@
+import argparse
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers like a checked website, with latency and failures controlled by the URL.
+
+    /<delay_ms>/<status> sleeps delay_ms and answers status; status "reset" drops the
+    connection and "hang" never answers. Any other path draws the delay and the outcome
+    from the server's latency range and failure rate. A query string is ignored, so
+    ?n=<i> can make URLs unique to get past the result cache.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def outcome(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) == 2 and parts[0].isdigit():
+            return int(parts[0]) / 1000, parts[1]
+        server = self.server
+        with server.lock:
+            delay = server.random.uniform(*server.latency_ms) / 1000
+            failed = server.random.random() < server.failure_rate
+        return delay, (server.random.choice(("500", "reset")) if failed else "200")
+
+    def respond(self, body):
+        delay, status = self.outcome()
+        time.sleep(delay)
+        if status == "hang":
+            time.sleep(3600)
+        if status == "reset":
+            # SO_LINGER with a zero timeout makes close() send a RST instead of a FIN.
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.close_connection = True
+            return
+        payload = b"ok"
+        self.send_response(int(status) if status.isdigit() else 200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if body:
+            self.wfile.write(payload)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs under concurrent probes, adding 1 s retransmits to the results.
+    request_queue_size = 128
+
+    def __init__(self, address, latency_ms=(0, 0), failure_rate=0.0, seed=0):
+        super().__init__(address, StandInHandler)
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start(host="127.0.0.1", port=0, **options):
+    """Start a stand-in server in a daemon thread and return it; its URL is server.base_url."""
+    server = StandInServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stand-in website with controlled latency and failures.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, nargs=2, default=(10, 100), metavar=("MIN", "MAX"))
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    args = parser.parse_args()
+    server = StandInServer((args.host, args.port), tuple(args.latency_ms), args.failure_rate)
+    print(f"Serving on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
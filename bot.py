@@ -1,29 +1,117 @@
 import logging
-import requests
 import asyncio
+import hashlib
 import os
+import time
 from dotenv import load_dotenv
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import (
+    Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+)
 from aiogram.filters import Command
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from api_client import ApiClient, RateLimited, acting_user
+from fsm_storage import SQLiteStorage
+from metrics import registry, serve_metrics
+from roles import RoleIndex
+from webhook import run_webhook
+
 load_dotenv()
 TOKEN = os.getenv("BOT_TOKEN")
 API_URL = os.getenv("API_URL")
 admin_ids_env = os.getenv("ADMIN_IDS", "")
 ADMIN_IDS = [x.strip() for x in admin_ids_env.split(",") if x.strip()]
+DOMAIN_JOB_POLL_INTERVAL = float(os.getenv("DOMAIN_JOB_POLL_INTERVAL", "2"))
+DOMAIN_JOB_POLL_TIMEOUT = float(os.getenv("DOMAIN_JOB_POLL_TIMEOUT", "1800"))
+ALERT_POLL_INTERVAL = float(os.getenv("ALERT_POLL_INTERVAL", "15"))
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+BOT_METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "0"))
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_DB_PATH = os.getenv("FSM_DB_PATH", "data/fsm.db")
+TASKS_PAGE_SIZE = int(os.getenv("TASKS_PAGE_SIZE", "20"))
+MAX_MESSAGE_LENGTH = 4096
+# Recent searches kept per user so the page buttons of older result messages still work.
+SEARCHES_KEPT = 20
 
 bot = Bot(token=TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+api = ApiClient(API_URL)
+roles = RoleIndex(api, admin_ids=ADMIN_IDS)
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-run.
+background_tasks = set()
+dp = Dispatcher(storage=SQLiteStorage(FSM_DB_PATH) if FSM_STORAGE == "sqlite" else MemoryStorage())
 logging.basicConfig(level=logging.INFO)
 
+handler_duration = registry.histogram("bot_handler_duration_seconds", "Time spent in bot handlers.", ("handler",))
+
+
+@dp.message.middleware()
+@dp.callback_query.middleware()
+async def handle_rate_limits(handler, event, data):
+    """Make API calls on behalf of the user and tell them when they hit a rate limit."""
+    user = data.get("event_from_user")
+    acting_user.set(user.id if user else None)
+    try:
+        return await handler(event, data)
+    except RateLimited as e:
+        # The FSM state is kept, so the user can send the same input again once the wait is over.
+        text = f"⏳ Too many requests, please try again in {rate_limit_wait(e.retry_after)}."
+        if isinstance(event, CallbackQuery):
+            await event.answer(text, show_alert=True)
+        else:
+            await event.answer(text, reply_markup=main_menu)
+
+
+def rate_limit_wait(seconds):
+    seconds = max(round(seconds), 1)
+    return f"{seconds} s" if seconds < 60 else f"{-(-seconds // 60)} min"
+
+
+@dp.message.middleware()
+@dp.callback_query.middleware()
+async def time_handlers(handler, event, data):
+    """Record how long every matched handler takes."""
+    started = time.perf_counter()
+    try:
+        return await handler(event, data)
+    finally:
+        handler_duration.observe(time.perf_counter() - started, handler=data["handler"].callback.__name__)
+
 
 def is_admin(telegram_id):
-    return str(telegram_id) in ADMIN_IDS
+    return roles.is_admin(telegram_id)
+
+
+def split_message(text, limit=MAX_MESSAGE_LENGTH):
+    """Split text on line boundaries into chunks that fit into one Telegram message."""
+    chunks, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            candidate = line
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def format_domain_result(res):
+    cached = " (cached)" if res.get("cached") else ""
+    return (f"Domain: {res.get('domain')}{cached}\n"
+            f"- SSL: {res.get('ssl')}\n"
+            f"- Status: {res.get('status')}\n"
+            f"- Availability: {res.get('availability')}")
 
 main_menu = ReplyKeyboardMarkup(
     keyboard=[
@@ -32,7 +120,8 @@ main_menu = ReplyKeyboardMarkup(
         [KeyboardButton(text="❌ Delete Task"), KeyboardButton(text="🗑 Delete All Tasks")],
         [KeyboardButton(text="➕ Add User"), KeyboardButton(text="❌ Delete User")],
         [KeyboardButton(text="✏️ Edit User"), KeyboardButton(text="🔎 Search Domains")],
-        [KeyboardButton(text="📋 Get All Users")]
+        [KeyboardButton(text="📋 Get All Users"), KeyboardButton(text="🔦 Search Tasks")],
+        [KeyboardButton(text="👁 Watch Domains"), KeyboardButton(text="🚫 Unwatch Domains")]
     ],
     resize_keyboard=True
 )
@@ -43,6 +132,9 @@ class CreateTask(StatesGroup):
 class GetTask(StatesGroup):
     waiting_id = State()
 
+class SearchTasks(StatesGroup):
+    waiting_query = State()
+
 class UpdateTask(StatesGroup):
     waiting_update = State()
 
@@ -61,6 +153,12 @@ class AdminEditUser(StatesGroup):
 class DomainSearch(StatesGroup):
     waiting_domains = State()
 
+class WatchDomains(StatesGroup):
+    waiting_domains = State()
+
+class UnwatchDomains(StatesGroup):
+    waiting_domains = State()
+
 
 @dp.message(Command("start"))
 async def cmd_start(message: Message):
@@ -79,7 +177,7 @@ async def cmd_create_task(message: Message, state: FSMContext):
 async def process_create_task(message: Message, state: FSMContext):
     """Receive task description, send it to the Flask API, and exit the state."""
     data = {"description": message.text}
-    response = requests.post(f"{API_URL}/create-todo", json=data)
+    response = await api.post("/create-todo", json=data)
     if response.status_code == 201:
         await message.answer("✅ Task created successfully!", reply_markup=main_menu)
     else:
@@ -87,19 +185,49 @@ async def process_create_task(message: Message, state: FSMContext):
     await state.clear()
 
 
+async def fetch_tasks_page(after):
+    """Fetch one page of tasks and render it as message text with navigation buttons."""
+    params = {"limit": TASKS_PAGE_SIZE, "after": after}
+    response = await api.get("/get-all-todo", params=params, conditional=True)
+    if response.status_code != 200:
+        return None, None
+    page = response.json()
+    todos = page.get("todos", [])
+    if not todos:
+        return "ℹ️ No tasks available.", None
+    text = "\n".join([f"🆔 {todo['id']}: {todo['description']}" for todo in todos])
+    buttons = []
+    if after:
+        buttons.append(InlineKeyboardButton(text="⏮ First", callback_data="tasks:0"))
+    if page.get("next_after"):
+        buttons.append(InlineKeyboardButton(text="Next ➡️", callback_data=f"tasks:{page['next_after']}"))
+    markup = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+    return split_message(f"📋 Task List:\n{text}")[0], markup
+
+
 @dp.message(F.text == "📋 List Tasks")
 async def cmd_list_tasks(message: Message):
-    """Retrieve and display all tasks from the database."""
-    response = requests.get(f"{API_URL}/get-all-todo")
-    if response.status_code == 200:
-        todos = response.json().get("todos", [])
-        if not todos:
-            await message.answer("ℹ️ No tasks available.", reply_markup=main_menu)
-        else:
-            text = "\n".join([f"🆔 {todo['id']}: {todo['description']}" for todo in todos])
-            await message.answer(f"📋 Task List:\n{text}", reply_markup=main_menu)
-    else:
+    """Retrieve and display the first page of tasks."""
+    text, markup = await fetch_tasks_page(0)
+    if text is None:
         await message.answer("⚠️ Failed to retrieve tasks.", reply_markup=main_menu)
+    else:
+        await message.answer(text, reply_markup=markup or main_menu)
+
+
+@dp.callback_query(F.data.startswith("tasks:"))
+async def process_tasks_page(callback: CallbackQuery):
+    """Replace the task list message with the page requested by an inline button."""
+    after = callback.data.split(":", 1)[1]
+    if not after.isdigit():
+        await callback.answer()
+        return
+    text, markup = await fetch_tasks_page(int(after))
+    if text is None:
+        await callback.answer("⚠️ Failed to retrieve tasks.")
+        return
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
 
 
 @dp.message(F.text == "🔍 Get Task by ID")
@@ -116,7 +244,7 @@ async def process_get_task(message: Message, state: FSMContext):
     if not todo_id.isdigit():
         await message.answer("⚠️ Please enter a valid number.")
         return
-    response = requests.get(f"{API_URL}/get-todo?id={todo_id}")
+    response = await api.get("/get-todo", params={"id": todo_id}, conditional=True)
     if response.status_code == 200:
         todo = response.json().get("todo", {})
         text = f"📌 Task:\nID: {todo.get('id')}\nDescription: {todo.get('description')}\nCreated: {todo.get('created_at')}"
@@ -126,6 +254,72 @@ async def process_get_task(message: Message, state: FSMContext):
     await state.clear()
 
 
+@dp.message(F.text == "🔦 Search Tasks")
+async def cmd_search_tasks(message: Message, state: FSMContext):
+    """Prompt the user to enter search words."""
+    await message.answer("Please send the words to search for:")
+    await state.set_state(SearchTasks.waiting_query)
+
+
+def search_id(query):
+    """Short key for query; callback data is limited to 64 bytes, too little for the query itself."""
+    return hashlib.sha1(query.encode()).hexdigest()[:12]
+
+
+async def fetch_search_page(query, offset):
+    """Fetch one page of search results and render it as message text with navigation buttons."""
+    params = {"q": query, "limit": TASKS_PAGE_SIZE, "offset": offset}
+    response = await api.get("/search-todo", params=params)
+    if response.status_code != 200:
+        return None, None
+    page = response.json()
+    todos = page.get("todos", [])
+    if not todos:
+        return "ℹ️ No matching tasks.", None
+    text = "\n".join([f"🆔 {todo['id']}: {todo['description']}" for todo in todos])
+    key = search_id(query)
+    buttons = []
+    if offset:
+        buttons.append(InlineKeyboardButton(text="⏮ First", callback_data=f"search:{key}:0"))
+    if page.get("next_offset"):
+        buttons.append(InlineKeyboardButton(text="Next ➡️", callback_data=f"search:{key}:{page['next_offset']}"))
+    markup = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+    return split_message(f"🔦 Results for \"{query}\":\n{text}")[0], markup
+
+
+@dp.message(SearchTasks.waiting_query, F.text)
+async def process_search_tasks(message: Message, state: FSMContext):
+    """Search tasks and show the first page of results."""
+    query = message.text.strip()
+    # Leave the state but keep the query, the page buttons look it up by search_id().
+    await state.set_state(None)
+    searches = (await state.get_data()).get("searches", {})
+    searches.pop(search_id(query), None)
+    searches[search_id(query)] = query
+    await state.set_data({"searches": dict(list(searches.items())[-SEARCHES_KEPT:])})
+    text, markup = await fetch_search_page(query, 0)
+    if text is None:
+        await message.answer("⚠️ Failed to search tasks.", reply_markup=main_menu)
+    else:
+        await message.answer(text, reply_markup=markup or main_menu)
+
+
+@dp.callback_query(F.data.startswith("search:"))
+async def process_search_page(callback: CallbackQuery, state: FSMContext):
+    """Replace the search results message with the page requested by an inline button."""
+    key, _, offset = callback.data.removeprefix("search:").partition(":")
+    query = (await state.get_data()).get("searches", {}).get(key)
+    if not offset.isdigit() or not query:
+        await callback.answer("ℹ️ This search has expired, please search again.")
+        return
+    text, markup = await fetch_search_page(query, int(offset))
+    if text is None:
+        await callback.answer("⚠️ Failed to search tasks.")
+        return
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+
+
 @dp.message(F.text == "✏️ Update Task")
 async def cmd_update_task(message: Message, state: FSMContext):
     """Prompt the user to enter task ID and new description."""
@@ -143,7 +337,7 @@ async def process_update_task(message: Message, state: FSMContext):
     try:
         todo_id, new_description = message.text.split(";")
         data = {"id": todo_id.strip(), "description": new_description.strip()}
-        response = requests.put(f"{API_URL}/update-todo", json=data)
+        response = await api.put("/update-todo", json=data)
         if response.status_code == 200:
             await message.answer("✅ Task updated successfully!", reply_markup=main_menu)
         else:
@@ -169,7 +363,7 @@ async def process_delete_task(message: Message, state: FSMContext):
         await state.clear()
         return
     data = {"id": todo_id}
-    response = requests.delete(f"{API_URL}/delete-todo", json=data)
+    response = await api.delete("/delete-todo", json=data)
     if response.status_code == 200:
         await message.answer("✅ Task deleted successfully!", reply_markup=main_menu)
     else:
@@ -180,7 +374,7 @@ async def process_delete_task(message: Message, state: FSMContext):
 @dp.message(F.text.lower() == "🗑 delete all tasks")
 async def cmd_delete_all_tasks(message: Message):
     """Delete all tasks from the database."""
-    response = requests.delete(f"{API_URL}/delete-all-todo")
+    response = await api.delete("/delete-all-todo")
     if response.status_code == 200:
         deleted_count = response.json().get("message", "Unknown response")
         await message.answer(f"✅ {deleted_count}", reply_markup=main_menu)
@@ -194,7 +388,7 @@ async def cmd_get_all_users(message: Message):
     if not is_admin(message.from_user.id):
         await message.answer("Access denied.", reply_markup=main_menu)
         return
-    response = requests.get(f"{API_URL}/get-users")
+    response = await api.get("/get-users", conditional=True)
     if response.status_code == 200:
         users = response.json().get("users", [])
         if not users:
@@ -225,14 +419,18 @@ async def process_add_user(message: Message, state: FSMContext):
         return
     try:
         telegram_id, group = [x.strip() for x in message.text.split(",")]
-        data = {"telegram_id": telegram_id, "group": group}
-        response = requests.post(f"{API_URL}/add-user", json=data)
-        if response.status_code == 201:
-            await message.answer("✅ User added successfully.", reply_markup=main_menu)
-        else:
-            await message.answer("⚠️ Failed to add user.", reply_markup=main_menu)
-    except Exception:
+    except ValueError:
         await message.answer("⚠️ Incorrect format. Use: telegram_id, group", reply_markup=main_menu)
+        await state.clear()
+        return
+    # Outside the try, so a RateLimited reaches handle_rate_limits and the state is kept for a retry.
+    data = {"telegram_id": telegram_id, "group": group}
+    response = await api.post("/add-user", json=data)
+    if response.status_code == 201:
+        roles.set_user(response.json()["user"])
+        await message.answer("✅ User added successfully.", reply_markup=main_menu)
+    else:
+        await message.answer("⚠️ Failed to add user.", reply_markup=main_menu)
     await state.clear()
 
 
@@ -255,8 +453,9 @@ async def process_delete_user(message: Message, state: FSMContext):
         return
     telegram_id = message.text.strip()
     data = {"telegram_id": telegram_id}
-    response = requests.delete(f"{API_URL}/delete-user", json=data)
+    response = await api.delete("/delete-user", json=data)
     if response.status_code == 200:
+        roles.remove_user(telegram_id)
         await message.answer("✅ User deleted successfully.", reply_markup=main_menu)
     else:
         await message.answer("⚠️ Failed to delete user.", reply_markup=main_menu)
@@ -282,14 +481,18 @@ async def process_edit_user(message: Message, state: FSMContext):
         return
     try:
         telegram_id, new_group = [x.strip() for x in message.text.split(",")]
-        data = {"telegram_id": telegram_id, "group": new_group}
-        response = requests.put(f"{API_URL}/edit-user", json=data)
-        if response.status_code == 200:
-            await message.answer("✅ User updated successfully.", reply_markup=main_menu)
-        else:
-            await message.answer("⚠️ Failed to update user.", reply_markup=main_menu)
-    except Exception:
+    except ValueError:
         await message.answer("⚠️ Incorrect format. Use: telegram_id, new group", reply_markup=main_menu)
+        await state.clear()
+        return
+    # Outside the try, so a RateLimited reaches handle_rate_limits and the state is kept for a retry.
+    data = {"telegram_id": telegram_id, "group": new_group}
+    response = await api.put("/edit-user", json=data)
+    if response.status_code == 200:
+        roles.set_user(response.json()["user"])
+        await message.answer("✅ User updated successfully.", reply_markup=main_menu)
+    else:
+        await message.answer("⚠️ Failed to update user.", reply_markup=main_menu)
     await state.clear()
 
 
@@ -302,26 +505,149 @@ async def cmd_search_domains(message: Message, state: FSMContext):
 
 @dp.message(DomainSearch.waiting_domains, F.text)
 async def process_search_domains(message: Message, state: FSMContext):
-    """Send the list of domains to the Flask API and display the results."""
+    """Submit the domains as a background job and send the results once it finishes."""
     data = {"domains": message.text}
-    response = requests.post(f"{API_URL}/search-domains", json=data)
+    response = await api.post("/submit-domain-job", json=data)
+    await state.clear()
+    if response.status_code != 202:
+        await message.answer("⚠️ Failed to check domains.", reply_markup=main_menu)
+        return
+    job = response.json()["job"]
+    progress = await message.answer(f"⏳ Checking {job['total']} domains, the results will arrive here.")
+    task = asyncio.create_task(watch_domain_job(message, progress, job["id"]))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def call_when_allowed(call, *args, **kwargs):
+    """Make an API call from a background task, waiting out rate limits instead of failing."""
+    while True:
+        try:
+            return await call(*args, **kwargs)
+        except RateLimited as e:
+            await asyncio.sleep(e.retry_after)
+
+
+async def watch_domain_job(message: Message, progress: Message, job_id):
+    """Poll a domain job, keep the progress message current and send the results when it is finished."""
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + DOMAIN_JOB_POLL_TIMEOUT
+    completed = 0
+    job = None
+    while loop.time() < give_up_at:
+        await asyncio.sleep(DOMAIN_JOB_POLL_INTERVAL)
+        response = await call_when_allowed(api.get, "/get-domain-job", params={"id": job_id, "results": 0})
+        if response.status_code == 404:
+            break
+        if response.status_code != 200:
+            continue
+        job = response.json()["job"]
+        if job["status"] in ("done", "failed"):
+            break
+        if job["completed"] != completed:
+            completed = job["completed"]
+            await progress.edit_text(f"⏳ Checked {completed}/{job['total']} domains...")
+
+    if job is None or job["status"] != "done":
+        await progress.edit_text("⚠️ Failed to check domains.")
+        await message.answer("⚠️ Failed to check domains.", reply_markup=main_menu)
+        return
+    response = await call_when_allowed(api.get, "/get-domain-job", params={"id": job_id})
+    if response.status_code != 200:
+        await message.answer("⚠️ Failed to retrieve domain check results.", reply_markup=main_menu)
+        return
+    results = response.json()["job"]["results"]
+    available = sum(1 for res in results if res and res.get("availability") == "available")
+    await progress.edit_text(f"✅ Checked {len(results)} domains ({available} available).")
+    reply = "\n\n".join(format_domain_result(res) for res in results if res)
+    chunks = split_message(reply) or ["ℹ️ No results."]
+    for chunk in chunks[:-1]:
+        await message.answer(chunk)
+    await message.answer(chunks[-1], reply_markup=main_menu)
+
+
+@dp.message(F.text == "👁 Watch Domains")
+async def cmd_watch_domains(message: Message, state: FSMContext):
+    """Prompt the user to enter domains to monitor."""
+    await message.answer("Enter domains to watch (each on a new line). You'll be notified when their state changes:")
+    await state.set_state(WatchDomains.waiting_domains)
+
+
+@dp.message(WatchDomains.waiting_domains, F.text)
+async def process_watch_domains(message: Message, state: FSMContext):
+    """Subscribe the chat to state changes of the given domains."""
+    data = {"domains": message.text, "chat_id": str(message.chat.id)}
+    response = await api.post("/watch-domain", json=data)
+    if response.status_code == 201:
+        watched = response.json().get("watched", [])
+        text = "\n".join([f"👁 {w['domain']} (every {w['interval']}s)" for w in watched])
+        await message.answer(split_message(f"✅ Watching:\n{text}")[0], reply_markup=main_menu)
+    else:
+        await message.answer("⚠️ Failed to watch domains.", reply_markup=main_menu)
+    await state.clear()
+
+
+@dp.message(F.text == "🚫 Unwatch Domains")
+async def cmd_unwatch_domains(message: Message, state: FSMContext):
+    """Prompt the user to enter domains to stop monitoring."""
+    await message.answer("Enter domains to stop watching (each on a new line):")
+    await state.set_state(UnwatchDomains.waiting_domains)
+
+
+@dp.message(UnwatchDomains.waiting_domains, F.text)
+async def process_unwatch_domains(message: Message, state: FSMContext):
+    """Unsubscribe the chat from the given domains."""
+    data = {"domains": message.text, "chat_id": str(message.chat.id)}
+    response = await api.delete("/unwatch-domain", json=data)
     if response.status_code == 200:
-        results = response.json().get("results", [])
-        reply = ""
-        for res in results:
-            reply += (f"Domain: {res.get('domain')}\n"
-                      f"- SSL: {res.get('ssl')}\n"
-                      f"- Status: {res.get('status')}\n"
-                      f"- Availability: {res.get('availability')}\n\n")
-        await message.answer(reply.strip(), reply_markup=main_menu)
+        await message.answer(f"✅ {response.json().get('message')}", reply_markup=main_menu)
     else:
-        await message.answer("⚠️ Failed to check domains.", reply_markup=main_menu)
+        await message.answer("⚠️ None of these domains were watched.", reply_markup=main_menu)
     await state.clear()
 
 
+async def poll_domain_alerts():
+    """Deliver domain state change alerts produced by the monitor and acknowledge them."""
+    while True:
+        # Claiming, not just listing, so that with several bot processes each alert is sent once.
+        response = await call_when_allowed(api.post, "/claim-domain-alerts")
+        alerts = response.json().get("alerts", []) if response.status_code == 200 else []
+        delivered = []
+        for alert in alerts:
+            try:
+                await bot.send_message(alert["chat_id"], alert["text"])
+            except Exception:
+                logging.exception("Failed to deliver alert %s", alert["id"])
+            # Undeliverable alerts (blocked bot, deleted chat) are acknowledged too, or they would be retried forever.
+            delivered.append(alert["id"])
+        if delivered:
+            ack = await call_when_allowed(api.post, "/ack-domain-alerts", json={"ids": delivered})
+            if ack.status_code == 200:
+                # More alerts may be waiting beyond this page.
+                continue
+        await asyncio.sleep(ALERT_POLL_INTERVAL)
+
+
 async def main():
-    """Run the bot and start polling updates."""
-    await dp.start_polling(bot)
+    """Run the bot, receiving updates by long polling or, with BOT_MODE=webhook, by webhook."""
+    await roles.refresh(full=True)
+    tasks = [asyncio.create_task(poll_domain_alerts()), asyncio.create_task(roles.run())]
+    # In webhook mode the metrics listener is opened by run_webhook, which adds the queue stats to it.
+    metrics_runner = None
+    if BOT_METRICS_PORT and BOT_MODE != "webhook":
+        metrics_runner = await serve_metrics("0.0.0.0", BOT_METRICS_PORT)
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot, WEBHOOK_URL, BOT_METRICS_PORT)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await api.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
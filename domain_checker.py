@@ -0,0 +1,389 @@
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from metrics import registry
+from resolver import dns_cache, open_socket, DOMAIN_DNS_TIMEOUT, NXDOMAIN
+
+DOMAIN_CHECK_TIMEOUT = float(os.getenv("DOMAIN_CHECK_TIMEOUT", "5"))
+DOMAIN_CHECK_WORKERS = int(os.getenv("DOMAIN_CHECK_WORKERS", "32"))
+DOMAIN_CHECK_PER_HOST = int(os.getenv("DOMAIN_CHECK_PER_HOST", "2"))
+DOMAIN_CHECK_PER_REQUEST = int(os.getenv("DOMAIN_CHECK_PER_REQUEST", "16"))
+DOMAIN_CHECK_DEADLINE = float(os.getenv("DOMAIN_CHECK_DEADLINE", "30"))
+DOMAIN_CACHE_TTL = float(os.getenv("DOMAIN_CACHE_TTL", "300"))
+DOMAIN_CACHE_NEGATIVE_TTL = float(os.getenv("DOMAIN_CACHE_NEGATIVE_TTL", "60"))
+DOMAIN_CACHE_SIZE = int(os.getenv("DOMAIN_CACHE_SIZE", "10000"))
+DOMAIN_PROBE_MODE = os.getenv("DOMAIN_PROBE_MODE", "head").lower()
+DOMAIN_POOL_CONNECTIONS = int(os.getenv("DOMAIN_POOL_CONNECTIONS", "256"))
+DOMAIN_POOL_MAXSIZE = int(os.getenv("DOMAIN_POOL_MAXSIZE", str(DOMAIN_CHECK_PER_HOST)))
+
+# Servers that answer these to HEAD are retried with a GET before we judge them.
+HEAD_FALLBACK_STATUSES = {403, 405, 501}
+
+# Shared by every request in the process, so its size is the global concurrency limit.
+executor = ThreadPoolExecutor(max_workers=DOMAIN_CHECK_WORKERS, thread_name_prefix="domain-check")
+
+# Connection timings of the probe currently running on this thread.
+probe_timings = threading.local()
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+class TimedConnectionMixin:
+    """Record the lookup and TCP connect times and take the addresses from the shared DNS cache.
+
+    A lookup started by the resolution stage is joined instead of repeated, and names
+    known not to exist fail without another lookup.
+    """
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        # A saturated resolver pool must not hold the probe past its connect timeout.
+        timeout = self.timeout if isinstance(self.timeout, (int, float)) else DOMAIN_DNS_TIMEOUT
+        try:
+            addresses = dns_cache.resolve(self._dns_host, timeout)
+        except FutureTimeoutError:
+            raise ConnectTimeoutError(self, f"Lookup of {self.host} timed out. (connect timeout={self.timeout})")
+        probe_timings.dns_ms = elapsed_ms(started)
+        if addresses == NXDOMAIN:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {self.host} does not exist")
+        started = time.perf_counter()
+        if addresses is None:
+            # The lookup failed (not NXDOMAIN); let urllib3 try the system resolver once more.
+            conn = super()._new_conn()
+        else:
+            try:
+                conn = open_socket(addresses, self.port, self.timeout, self.source_address, self.socket_options)
+            except socket.timeout:
+                raise ConnectTimeoutError(
+                    self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})")
+            except OSError as e:
+                raise NewConnectionError(self, f"Failed to establish a new connection: {e}")
+        probe_timings.tcp_connect_ms = elapsed_ms(started)
+        probe_timings.connected_at = time.perf_counter()
+        return conn
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        super().connect()
+        # Measured from the end of _new_conn, so the lookup and the TCP connect are not counted.
+        probe_timings.tls_handshake_ms = elapsed_ms(probe_timings.connected_at)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record TCP connect and TLS handshake times."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+# Keep-alive connections are reused between probes of the same host.
+session = requests.Session()
+adapter = TimedHTTPAdapter(pool_connections=DOMAIN_POOL_CONNECTIONS, pool_maxsize=DOMAIN_POOL_MAXSIZE)
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+
+
+class HostLimiter:
+    """Count in-flight probes per host and refuse to go over the limit."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, host):
+        with self._lock:
+            active = self._active.get(host, 0)
+            if active >= self.limit:
+                return False
+            self._active[host] = active + 1
+            return True
+
+    def release(self, host):
+        with self._lock:
+            active = self._active.get(host, 0) - 1
+            if active > 0:
+                self._active[host] = active
+            else:
+                self._active.pop(host, None)
+
+
+host_limiter = HostLimiter(DOMAIN_CHECK_PER_HOST)
+
+
+class ResultCache:
+    """LRU cache of probe results with separate TTLs for successful and failed checks.
+
+    Concurrent lookups of a key that is not cached share a single probe: the first
+    caller runs it and the others wait for its result.
+    """
+
+    def __init__(self, ttl, negative_ttl, max_size):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def _put(self, key, result):
+        ttl = self.ttl if result["ssl"] == "OK" else self.negative_ttl
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_or_probe(self, key, probe, refresh=False):
+        """Return (result, cached) for key, running probe() at most once at a time per key.
+
+        With refresh=True a cached result is ignored and replaced by a new probe.
+        """
+        with self._lock:
+            result = None if refresh else self._get(key)
+            if result is not None:
+                return result, True
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            result = probe()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._put(key, result)
+            del self._inflight[key]
+        future.set_result(result)
+        return result, False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+result_cache = ResultCache(DOMAIN_CACHE_TTL, DOMAIN_CACHE_NEGATIVE_TTL, DOMAIN_CACHE_SIZE)
+
+
+def normalize_url(domain):
+    if not domain.startswith("http"):
+        domain = "https://" + domain
+    return domain
+
+
+def host_of(domain):
+    return (urlsplit(normalize_url(domain)).hostname or domain).lower()
+
+
+def cache_key(domain):
+    parts = urlsplit(normalize_url(domain.strip()))
+    key = f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path.rstrip('/')}"
+    return f"{key}?{parts.query}" if parts.query else key
+
+
+def timeout_result(domain):
+    # Stands in for a domain that was not probed (or not to the end) before the deadline.
+    return {"domain": normalize_url(domain), "ssl": "Timeout", "status": "N/A", "availability": "not available",
+            "cached": False, "deadline_exceeded": True}
+
+
+def unresolved_result(domain):
+    # Same shape as check_domain() gives for a name that fails to resolve during the HTTP request.
+    return {"domain": normalize_url(domain), "ssl": "Error", "status": "N/A", "availability": "not available",
+            "method": None,
+            "timings": {"dns_ms": None, "tcp_connect_ms": None, "tls_handshake_ms": None, "ttfb_ms": None},
+            "cached": False}
+
+
+def probe(url):
+    """Fetch only the status line and headers of url, trying HEAD before a streamed GET."""
+    if DOMAIN_PROBE_MODE == "head":
+        response = session.head(url, timeout=DOMAIN_CHECK_TIMEOUT, allow_redirects=True)
+        if response.status_code not in HEAD_FALLBACK_STATUSES:
+            return response
+        response.close()
+    # Closing a streamed response drops the connection instead of downloading the body.
+    response = session.get(url, timeout=DOMAIN_CHECK_TIMEOUT, stream=True)
+    response.close()
+    return response
+
+
+probe_phase_duration = registry.histogram(
+    "domain_probe_phase_seconds", "Outbound probe timings by phase.", ("phase",))
+probes = registry.counter("domain_probes_total", "Outbound probes by outcome.", ("outcome",))
+
+
+def check_domain(domain):
+    domain = normalize_url(domain)
+    probe_timings.dns_ms = None
+    probe_timings.tcp_connect_ms = None
+    probe_timings.tls_handshake_ms = None
+    started = time.perf_counter()
+    method = None
+    ttfb_ms = None
+    try:
+        response = probe(domain)
+        ttfb_ms = elapsed_ms(started)
+        method = response.request.method
+        status = response.status_code
+        ssl_ok = "OK"
+        availability = "available" if status == 200 else "not available"
+    except requests.exceptions.SSLError:
+        ssl_ok = "Failed"
+        status = "N/A"
+        availability = "not available"
+    except Exception:
+        ssl_ok = "Error"
+        status = "N/A"
+        availability = "not available"
+    # Lookup, connect and handshake stay None when a pooled keep-alive connection was reused.
+    timings = {
+        "dns_ms": probe_timings.dns_ms,
+        "tcp_connect_ms": probe_timings.tcp_connect_ms,
+        "tls_handshake_ms": probe_timings.tls_handshake_ms,
+        "ttfb_ms": ttfb_ms,
+    }
+    probes.inc(outcome=ssl_ok if ssl_ok != "OK" else availability)
+    for phase, value in timings.items():
+        if value is not None:
+            probe_phase_duration.observe(value / 1000, phase=phase[:-3])
+    return {"domain": domain, "ssl": ssl_ok, "status": status, "availability": availability,
+            "method": method, "timings": timings}
+
+
+def cached_check_domain(domain, refresh=False):
+    result, cached = result_cache.get_or_probe(cache_key(domain), lambda: check_domain(domain), refresh)
+    return {**result, "domain": normalize_url(domain), "cached": cached}
+
+
+def iter_check_domains(domains, deadline=DOMAIN_CHECK_DEADLINE, use_cache=True):
+    """Check domains concurrently and yield (index, result) pairs as they complete.
+
+    Entries that normalize to the same URL (example.com, https://example.com/) are probed
+    once. Results already in the cache are yielded right away without touching the pool,
+    unless use_cache is False, in which case every domain is probed again. The hosts left
+    are then resolved together, and names that do not exist fail without an HTTP attempt.
+    At most DOMAIN_CHECK_PER_REQUEST probes of this call are in flight at once and
+    no host gets more than DOMAIN_CHECK_PER_HOST probes across the whole process.
+    Domains still pending or running once the deadline passes get a timeout result.
+    """
+    expires_at = time.monotonic() + deadline
+    entries = OrderedDict()
+    for index, domain in enumerate(domains):
+        entries.setdefault(cache_key(domain), []).append((index, domain))
+
+    def fan_out(key, result):
+        for index, domain in entries[key]:
+            yield index, {**result, "domain": normalize_url(domain)}
+
+    pending = deque()
+    for key, members in entries.items():
+        result = result_cache.get(key) if use_cache else None
+        if result is None:
+            pending.append(key)
+        else:
+            yield from fan_out(key, {**result, "cached": True})
+
+    answers = dns_cache.resolve_all({host_of(entries[key][0][1]) for key in pending},
+                                    timeout=max(0.0, min(DOMAIN_DNS_TIMEOUT, expires_at - time.monotonic())))
+    resolved = deque()
+    for key in pending:
+        if answers.get(host_of(entries[key][0][1])) == NXDOMAIN:
+            yield from fan_out(key, unresolved_result(entries[key][0][1]))
+        else:
+            resolved.append(key)
+    pending = resolved
+
+    running = {}
+    while pending or running:
+        blocked = deque()
+        while pending and len(running) < DOMAIN_CHECK_PER_REQUEST:
+            key = pending.popleft()
+            domain = entries[key][0][1]
+            host = host_of(domain)
+            if not host_limiter.try_acquire(host):
+                blocked.append(key)
+                continue
+            future = executor.submit(cached_check_domain, domain, not use_cache)
+            future.add_done_callback(lambda _, host=host: host_limiter.release(host))
+            running[future] = key
+        blocked.extend(pending)
+        pending = blocked
+
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            break
+        if not running:
+            # Every pending host is busy with probes from other requests.
+            time.sleep(min(0.05, remaining))
+            continue
+        # Wake up periodically while hosts are blocked so freed slots get picked up.
+        timeout = min(remaining, 0.1) if pending else remaining
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from fan_out(running.pop(future), future.result())
+
+    for future, key in running.items():
+        future.cancel()
+        yield from fan_out(key, timeout_result(entries[key][0][1]))
+    for key in pending:
+        yield from fan_out(key, timeout_result(entries[key][0][1]))
+
+
+def check_domains(domains, deadline=DOMAIN_CHECK_DEADLINE, use_cache=True):
+    """Check domains concurrently and return the results in input order."""
+    results = [None] * len(domains)
+    for index, result in iter_check_domains(domains, deadline, use_cache):
+        results[index] = result
+    return results
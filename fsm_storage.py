@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", str(24 * 3600)))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.05"))
+FSM_FLUSH_BATCH = int(os.getenv("FSM_FLUSH_BATCH", "500"))
+FSM_CLEANUP_INTERVAL = float(os.getenv("FSM_CLEANUP_INTERVAL", "600"))
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS fsm_state ("
+    "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_fsm_state_updated_at ON fsm_state (updated_at)",
+]
+UPSERT_STATE = ("INSERT INTO fsm_state (key, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at")
+UPSERT_DATA = ("INSERT INTO fsm_state (key, data, updated_at) VALUES (?, ?, ?) "
+               "ON CONFLICT (key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at")
+
+
+class SQLiteStorage(BaseStorage):
+    """aiogram FSM storage in a SQLite file that several bot processes can share.
+
+    Writes are buffered and flushed in one transaction every FSM_FLUSH_INTERVAL seconds
+    (or as soon as FSM_FLUSH_BATCH keys are waiting); reads see the buffer first, so a
+    process always reads its own writes. Other processes see them after the flush.
+    States untouched for FSM_STATE_TTL seconds expire.
+    """
+
+    def __init__(self, path, ttl=FSM_STATE_TTL):
+        self.path = path
+        self.ttl = ttl
+        # One thread owns the connection, which also serializes all database work.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-storage")
+        self._connection = None
+        self._pending = {}
+        self._flushing = {}
+        self._flush_tasks = set()
+        # True while a flush is waiting to start; a flush that is already writing does not count,
+        # since it took its batch before the newest writes arrived.
+        self._flush_scheduled = False
+        self._flush_lock = asyncio.Lock()
+        self._next_cleanup = 0
+
+    @staticmethod
+    def build_key(key):
+        return ":".join(str(part) if part is not None else "" for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+        ))
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                self._connection.execute(statement)
+            self._connection.commit()
+        return self._connection
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _read(self, key):
+        row = self._connect().execute(
+            "SELECT state, data FROM fsm_state WHERE key = ? AND updated_at > ?", (key, time.time() - self.ttl)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else (None, {})
+
+    def _write(self, entries):
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            removed = [(key,) for key, entry in entries.items()
+                       if entry.get("state", "") is None and entry.get("data") == {}]
+            removed_keys = {key for key, in removed}
+            connection.executemany("DELETE FROM fsm_state WHERE key = ?", removed)
+            connection.executemany(UPSERT_STATE, [
+                (key, entry["state"], now) for key, entry in entries.items()
+                if "state" in entry and key not in removed_keys
+            ])
+            connection.executemany(UPSERT_DATA, [
+                (key, json.dumps(entry["data"]), now) for key, entry in entries.items()
+                if "data" in entry and key not in removed_keys
+            ])
+            if now >= self._next_cleanup:
+                connection.execute("DELETE FROM fsm_state WHERE updated_at <= ?", (now - self.ttl,))
+                self._next_cleanup = now + FSM_CLEANUP_INTERVAL
+
+    def _buffered(self, key, field):
+        for buffer in (self._pending, self._flushing):
+            entry = buffer.get(key)
+            if entry is not None and field in entry:
+                return True, entry[field]
+        return False, None
+
+    def _buffer(self, key, field, value):
+        self._pending.setdefault(key, {})[field] = value
+        if len(self._pending) >= FSM_FLUSH_BATCH:
+            self._schedule_flush(0)
+        elif not self._flush_scheduled:
+            self._schedule_flush(FSM_FLUSH_INTERVAL)
+
+    def _schedule_flush(self, delay):
+        self._flush_scheduled = True
+        task = asyncio.create_task(self._flush_later(delay))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        self._flush_scheduled = False
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to flush FSM states, will retry")
+            self._schedule_flush(FSM_FLUSH_INTERVAL)
+
+    async def flush(self):
+        # Flushes run one at a time so an older batch never lands after a newer one.
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            try:
+                await self._run(self._write, self._flushing)
+            except Exception:
+                # Put the batch back under any newer writes so the next flush retries it.
+                for key, entry in self._flushing.items():
+                    self._pending[key] = {**entry, **self._pending.get(key, {})}
+                raise
+            finally:
+                self._flushing = {}
+
+    async def set_state(self, key, state=None):
+        self._buffer(self.build_key(key), "state", state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key):
+        key = self.build_key(key)
+        found, state = self._buffered(key, "state")
+        if found:
+            return state
+        state, _ = await self._run(self._read, key)
+        return state
+
+    async def set_data(self, key, data):
+        self._buffer(self.build_key(key), "data", dict(data))
+
+    async def get_data(self, key):
+        key = self.build_key(key)
+        found, data = self._buffered(key, "data")
+        if found:
+            return dict(data)
+        _, data = await self._run(self._read, key)
+        return data
+
+    async def close(self):
+        for task in list(self._flush_tasks):
+            task.cancel()
+        await self.flush()
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
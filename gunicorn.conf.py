@@ -0,0 +1,52 @@
+import glob
+import multiprocessing
+import os
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '5001')}"
+workers = int(os.getenv("API_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("API_THREADS", "4"))
+# Not API_TIMEOUT, which is the bot's per-call client timeout; this must outlast DOMAIN_CHECK_DEADLINE plus DNS.
+timeout = int(os.getenv("API_WORKER_TIMEOUT", "60"))
+# On SIGTERM workers stop accepting and get this long to finish in-flight requests.
+graceful_timeout = int(os.getenv("API_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("API_KEEPALIVE", "5"))
+max_requests = int(os.getenv("API_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("API_MAX_REQUESTS_JITTER", "0"))
+accesslog = "-"
+
+
+def on_starting(server):
+    # Values left by workers of a previous run would be added to the new ones.
+    from metrics import METRICS_DIR
+
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        os.remove(path)
+
+
+def post_worker_init(worker):
+    """Pick up domain jobs left queued by a previous deploy; claim_job keeps workers from running one twice.
+
+    Then keep sending heartbeats for this worker's jobs and take over those of workers that died.
+    Also publish the worker's metrics, so /metrics on any worker reports all of them.
+    """
+    from jobs import resume_jobs, supervise_jobs
+    from metrics import registry
+
+    registry.share()
+    app = worker.wsgi
+    with app.app_context():
+        resume_jobs(app)
+    supervise_jobs(app)
+
+
+def worker_exit(server, worker):
+    # Queued and running jobs of this worker go back to the queue; the next worker's resume_jobs starts them over.
+    from jobs import release_jobs
+    from metrics import registry
+
+    app = getattr(worker, "wsgi", None)
+    if app is not None:
+        with app.app_context():
+            release_jobs()
+    registry.flush()
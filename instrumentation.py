@@ -0,0 +1,104 @@
+import logging
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import registry, COUNT_BUCKETS, CONTENT_TYPE
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_EXPLAIN = os.getenv("SLOW_REQUEST_EXPLAIN", "1").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("slow_requests")
+
+request_duration = registry.histogram(
+    "api_request_duration_seconds", "Time spent handling API requests.", ("endpoint", "method", "status"))
+request_queries = registry.histogram(
+    "api_request_db_queries", "SQL statements executed per API request.", ("endpoint",), COUNT_BUCKETS)
+request_query_time = registry.histogram(
+    "api_request_db_seconds", "Time spent in SQL statements per API request.", ("endpoint",))
+query_duration = registry.histogram(
+    "db_query_duration_seconds", "Duration of single SQL statements.", ("operation",))
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    query_duration.observe(duration, operation=operation)
+    if has_request_context() and "db_queries" in g:
+        g.db_queries += 1
+        g.db_time += duration
+        if g.statements is not None:
+            g.statements.append((statement, parameters, executemany, duration))
+
+
+@event.listens_for(Engine, "handle_error")
+def drop_query_timer(context):
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def endpoint_label():
+    # The URL rule rather than the path, so ids in paths cannot blow up the label cardinality.
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def explain(connection, statement, parameters):
+    prefix = "EXPLAIN QUERY PLAN " if connection.dialect.name == "sqlite" else "EXPLAIN "
+    rows = connection.exec_driver_sql(prefix + statement, parameters).all()
+    return "\n".join("    " + " | ".join(str(column) for column in row) for row in rows)
+
+
+def log_slow_request(engine, duration, statements):
+    lines = [f"{request.method} {request.full_path} took {duration * 1000:.1f} ms "
+             f"with {len(statements)} queries ({sum(s[3] for s in statements) * 1000:.1f} ms in SQL)"]
+    with engine.connect() as connection:
+        for statement, parameters, executemany, query_time in statements:
+            lines.append(f"  {query_time * 1000:.1f} ms: {statement}")
+            # Plans are only taken for reads with a single parameter set; EXPLAIN never runs the statement.
+            if SLOW_REQUEST_EXPLAIN and not executemany and statement.lstrip().upper().startswith("SELECT"):
+                try:
+                    lines.append(explain(connection, statement, parameters))
+                except Exception as e:
+                    lines.append(f"    (no plan: {e})")
+    logger.warning("\n".join(lines))
+
+
+def instrument_app(app, db):
+    """Record latency and SQL usage of every request, serve /metrics and log slow requests."""
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+        g.statements = [] if SLOW_REQUEST_MS else None
+
+    @app.after_request
+    def record_request(response):
+        if "request_started" not in g:
+            return response
+        duration = time.perf_counter() - g.request_started
+        endpoint = endpoint_label()
+        request_duration.observe(duration, endpoint=endpoint, method=request.method, status=response.status_code)
+        request_queries.observe(g.db_queries, endpoint=endpoint)
+        request_query_time.observe(g.db_time, endpoint=endpoint)
+        statements, g.statements = g.statements, None
+        if SLOW_REQUEST_MS and duration * 1000 >= SLOW_REQUEST_MS:
+            try:
+                log_slow_request(db.engine, duration, statements)
+            except Exception:
+                logger.exception("Failed to log slow request")
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(registry.render(), headers={"Content-Type": CONTENT_TYPE})
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from domain_checker import iter_check_domains
+from models import db, DomainJob
+
+DOMAIN_JOB_WORKERS = int(os.getenv("DOMAIN_JOB_WORKERS", "4"))
+DOMAIN_JOB_DEADLINE = float(os.getenv("DOMAIN_JOB_DEADLINE", "600"))
+DOMAIN_JOB_PROGRESS_BATCH = int(os.getenv("DOMAIN_JOB_PROGRESS_BATCH", "25"))
+DOMAIN_JOB_HEARTBEAT_INTERVAL = float(os.getenv("DOMAIN_JOB_HEARTBEAT_INTERVAL", "10"))
+DOMAIN_JOB_HEARTBEAT_TIMEOUT = float(os.getenv("DOMAIN_JOB_HEARTBEAT_TIMEOUT", "60"))
+
+# Jobs run on their own pool; the probes inside them still share the domain checker pool.
+job_executor = ThreadPoolExecutor(max_workers=DOMAIN_JOB_WORKERS, thread_name_prefix="domain-job")
+
+# Set on shutdown: running jobs stop at their next result, release_jobs() having requeued them.
+stopping = threading.Event()
+
+# Random part in case the module is imported before gunicorn forks (preload_app): the pid tells workers apart.
+INSTANCE_TOKEN = uuid.uuid4().hex[:8]
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id():
+    """Identify this process as the owner of the jobs it runs."""
+    return f"{socket.gethostname()}:{os.getpid()}:{INSTANCE_TOKEN}"
+
+
+def submit_job(app, domains):
+    """Store a new job and hand it to the local worker pool."""
+    job = DomainJob(id=uuid.uuid4().hex, domains=json.dumps(domains), results=json.dumps([None] * len(domains)),
+                    total=len(domains))
+    db.session.add(job)
+    db.session.commit()
+    job_executor.submit(run_job, app, job.id)
+    return job
+
+
+def claim_job(job_id):
+    """Atomically move a queued job to running; False if another worker got it first."""
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(DomainJob)
+        .where(DomainJob.id == job_id, DomainJob.status == "queued")
+        .values(status="running", started_at=now, owner=worker_id(), heartbeat_at=now)
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def run_job(app, job_id):
+    with app.app_context():
+        try:
+            if claim_job(job_id):
+                execute_job(job_id)
+        finally:
+            db.session.remove()
+
+
+def save_job(job_id, **values):
+    """Write to a job this process still owns; a job requeued behind its back is left alone."""
+    db.session.execute(
+        update(DomainJob)
+        .where(DomainJob.id == job_id, DomainJob.status == "running", DomainJob.owner == worker_id())
+        .values(heartbeat_at=datetime.utcnow(), **values)
+    )
+    db.session.commit()
+
+
+def execute_job(job_id):
+    job = db.session.get(DomainJob, job_id)
+    try:
+        results = json.loads(job.results)
+        completed = 0
+        for index, result in iter_check_domains(json.loads(job.domains), DOMAIN_JOB_DEADLINE):
+            if stopping.is_set():
+                return
+            results[index] = result
+            completed += 1
+            if completed % DOMAIN_JOB_PROGRESS_BATCH == 0:
+                save_job(job_id, results=json.dumps(results), completed=completed)
+        save_job(job_id, results=json.dumps(results), completed=completed, status="done",
+                 finished_at=datetime.utcnow())
+    except Exception as e:
+        logger.exception("Domain job %s failed", job_id)
+        db.session.rollback()
+        save_job(job_id, status="failed", error=str(e)[:255], finished_at=datetime.utcnow())
+
+
+def release_jobs():
+    """Hand this process's jobs back to the queue when it shuts down and return how many were running.
+
+    Jobs not started yet are dropped from the local pool (they are still queued in the
+    database). Running ones are set back to queued and stop at their next result, so the
+    worker can exit instead of being killed while they hold its threads.
+    """
+    stopping.set()
+    job_executor.shutdown(wait=False, cancel_futures=True)
+    released = db.session.execute(
+        update(DomainJob)
+        .where(DomainJob.status == "running", DomainJob.owner == worker_id())
+        .values(status="queued", completed=0, owner=None, heartbeat_at=None)
+    ).rowcount
+    db.session.commit()
+    if released:
+        logger.info("Requeued %s running domain jobs on shutdown", released)
+    return released
+
+
+def requeue_orphaned_jobs():
+    """Put running jobs whose owner stopped sending heartbeats back in the queue and return their ids."""
+    stale_before = datetime.utcnow() - timedelta(seconds=DOMAIN_JOB_HEARTBEAT_TIMEOUT)
+    orphaned = and_(
+        DomainJob.status == "running",
+        or_(DomainJob.heartbeat_at < stale_before,
+            # Jobs started before heartbeats existed.
+            and_(DomainJob.heartbeat_at.is_(None),
+                 or_(DomainJob.started_at.is_(None), DomainJob.started_at < stale_before))),
+    )
+    job_ids = list(db.session.scalars(select(DomainJob.id).where(orphaned)))
+    if job_ids:
+        # The conditions are repeated so a job that sent a heartbeat in the meantime keeps running.
+        db.session.execute(
+            update(DomainJob).where(DomainJob.id.in_(job_ids), orphaned)
+            .values(status="queued", completed=0, owner=None, heartbeat_at=None)
+        )
+        logger.warning("Requeued %s orphaned domain jobs", len(job_ids))
+    db.session.commit()
+    return job_ids
+
+
+def resume_jobs(app):
+    """Requeue jobs left behind by a worker that died and submit everything still queued."""
+    requeue_orphaned_jobs()
+    for job_id in db.session.scalars(select(DomainJob.id).where(DomainJob.status == "queued")):
+        job_executor.submit(run_job, app, job_id)
+
+
+def supervise_jobs(app, stop_event=None):
+    """Keep the heartbeat of this process's jobs fresh and take over jobs of processes that died, until stopped."""
+    stop_event = stop_event or threading.Event()
+
+    def loop():
+        with app.app_context():
+            # After release_jobs() the pool is shut down and the jobs belong to the queue again.
+            while not stop_event.wait(DOMAIN_JOB_HEARTBEAT_INTERVAL) and not stopping.is_set():
+                try:
+                    db.session.execute(
+                        update(DomainJob)
+                        .where(DomainJob.status == "running", DomainJob.owner == worker_id())
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    db.session.commit()
+                    for job_id in requeue_orphaned_jobs():
+                        job_executor.submit(run_job, app, job_id)
+                except Exception:
+                    logger.exception("Domain job supervision failed")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    threading.Thread(target=loop, name="domain-job-supervisor", daemon=True).start()
+    return stop_event
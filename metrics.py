@@ -0,0 +1,277 @@
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+# Where API workers publish their values so that any of them can serve the sum (see Registry.share).
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "todoplash-metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+    def merge(self, values):
+        for key, value in values:
+            self.inc(value, **dict(zip(self.labelnames, key)))
+
+    def render(self):
+        with self.lock:
+            values = list(self.values.items())
+        return self.header() + [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+                                for key, value in values]
+
+
+class Gauge(Metric):
+    """A gauge whose value is read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def snapshot(self):
+        return self.callback()
+
+    def render(self):
+        return self.header() + [f"{self.name} {format_value(self.callback())}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(key), list(counts), total] for key, (counts, total) in self.values.items()]
+
+    def merge(self, values):
+        with self.lock:
+            for key, counts, total in values:
+                state = self.values.setdefault(tuple(key), [[0] * len(self.buckets), 0.0])
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+
+    def render(self):
+        with self.lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        lines = self.header()
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = format_labels(self.labelnames, key, [("le", format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    """Process-wide metrics rendered in the Prometheus text exposition format.
+
+    Values are kept per process. Processes that share() a directory also publish them
+    there, and render() then returns the sum over all of them, so a scrape that lands on
+    any gunicorn worker sees the whole API.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.directory = None
+
+    def register(self, metric):
+        with self.lock:
+            # Modules may be imported more than once (e.g. as __main__); keep the first instance.
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback):
+        with self.lock:
+            # A later callback replaces an earlier one, e.g. when the webhook queue is recreated.
+            self.metrics[name] = Gauge(name, documentation, callback)
+        return self.metrics[name]
+
+    def share(self, directory=METRICS_DIR, interval=METRICS_FLUSH_INTERVAL):
+        """Publish this process's values in directory every interval seconds and render the sum of all processes.
+
+        Files of exited processes are kept, so counters and histograms do not go back when a
+        worker is replaced; their gauges are left out. The directory is emptied by whoever
+        starts the processes (the gunicorn master, see gunicorn.conf.py).
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+        def flush_periodically():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush()
+                except OSError:
+                    logger.exception("Failed to publish metrics")
+
+        threading.Thread(target=flush_periodically, name="metrics-flush", daemon=True).start()
+
+    def flush(self):
+        """Write this process's values to the shared directory."""
+        if self.directory is None:
+            return
+        with self.lock:
+            metrics = list(self.metrics.values())
+        snapshot = {"pid": os.getpid(), "metrics": [
+            {"name": metric.name, "kind": metric.kind, "documentation": metric.documentation,
+             "labelnames": metric.labelnames, "buckets": list(getattr(metric, "buckets", ()))[:-1],
+             "values": metric.snapshot()}
+            for metric in metrics
+        ]}
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f)
+        # Readers see either the previous file or the new one, never a partial write.
+        os.replace(path + ".tmp", path)
+
+    def merged(self):
+        """Metrics summed over every process that published to the shared directory."""
+        self.flush()
+        merged = {}
+        gauges = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = snapshot["pid"] == os.getpid() or pid_alive(snapshot["pid"])
+            for entry in snapshot["metrics"]:
+                name, kind = entry["name"], entry["kind"]
+                if kind == "gauge":
+                    gauges.setdefault(name, [entry["documentation"], 0])
+                    if alive:
+                        gauges[name][1] += entry["values"]
+                    continue
+                metric = merged.get(name)
+                if metric is None:
+                    metric = merged[name] = (Counter(name, entry["documentation"], entry["labelnames"])
+                                             if kind == "counter" else
+                                             Histogram(name, entry["documentation"], entry["labelnames"],
+                                                       entry["buckets"]))
+                metric.merge(entry["values"])
+        for name, (documentation, value) in gauges.items():
+            merged[name] = Gauge(name, documentation, lambda value=value: value)
+        return list(merged.values())
+
+    def render(self):
+        if self.directory is not None:
+            metrics = self.merged()
+        else:
+            with self.lock:
+                metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+async def serve_metrics(host, port, routes=None):
+    """Expose the registry on http://host:port/metrics from the running event loop (used by the bot).
+
+    routes maps further GET paths to aiohttp handlers served on the same listener.
+    """
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    for path, handler in (routes or {}).items():
+        app.router.add_get(path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
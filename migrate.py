@@ -0,0 +1,25 @@
+import logging
+
+from models import db
+from search import ensure_search_index
+from storage import upgrade_schema
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(app):
+    """Bring the schema and the search index up to date.
+
+    Runs once per deploy, before any API worker starts, so workers never race on DDL.
+    """
+    with app.app_context():
+        upgrade_schema(db)
+        ensure_search_index()
+    logger.info("Schema is up to date")
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    logging.basicConfig(level=logging.INFO)
+    migrate(create_app())
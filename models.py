@@ -1,13 +1,18 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from datetime import datetime
+from itertools import chain
+import json
 
 db = SQLAlchemy()
 
 
 class ToDo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    description = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    description = db.Column(db.String(255), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def to_dict(self):
         return {
@@ -22,6 +27,7 @@ class User(db.Model):
     telegram_id = db.Column(db.String(20), unique=True, nullable=False)
     group = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def to_dict(self):
         return {
@@ -30,3 +36,142 @@ class User(db.Model):
             "group": self.group,
             "created_at": self.created_at.strftime("%d-%m-%Y %H:%M:%S")
         }
+
+
+class DomainJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    domains = db.Column(db.Text, nullable=False)
+    results = db.Column(db.Text, nullable=False, default="[]")
+    total = db.Column(db.Integer, nullable=False)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # The process running the job and when it last said so; jobs whose heartbeat stops are requeued.
+    owner = db.Column(db.String(64))
+    heartbeat_at = db.Column(db.DateTime)
+
+    def to_dict(self, with_results=True):
+        job = {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "error": self.error,
+            "created_at": self.created_at.strftime("%d-%m-%Y %H:%M:%S"),
+            "finished_at": self.finished_at.strftime("%d-%m-%Y %H:%M:%S") if self.finished_at else None
+        }
+        if with_results:
+            job["results"] = json.loads(self.results)
+        return job
+
+
+class WatchedDomain(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    domain = db.Column(db.String(255), unique=True, nullable=False)
+    interval = db.Column(db.Integer, nullable=False)
+    last_ssl = db.Column(db.String(10))
+    last_status = db.Column(db.String(10))
+    last_availability = db.Column(db.String(20))
+    last_checked_at = db.Column(db.DateTime)
+    next_check_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    watchers = db.relationship("DomainWatcher", backref="watched_domain", cascade="all, delete-orphan")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "domain": self.domain,
+            "interval": self.interval,
+            "ssl": self.last_ssl,
+            "status": self.last_status,
+            "availability": self.last_availability,
+            "last_checked_at": self.last_checked_at.strftime("%d-%m-%Y %H:%M:%S") if self.last_checked_at else None,
+            "created_at": self.created_at.strftime("%d-%m-%Y %H:%M:%S")
+        }
+
+
+class DomainWatcher(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    watched_domain_id = db.Column(db.Integer, db.ForeignKey("watched_domain.id"), nullable=False)
+    chat_id = db.Column(db.String(20), nullable=False, index=True)
+
+    __table_args__ = (db.UniqueConstraint("watched_domain_id", "chat_id"),)
+
+
+class DomainCheck(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    watched_domain_id = db.Column(db.Integer, db.ForeignKey("watched_domain.id"), nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False)
+    ssl = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.SmallInteger)
+    available = db.Column(db.Boolean, nullable=False)
+
+    __table_args__ = (db.Index("ix_domain_check_watched_checked", "watched_domain_id", "checked_at"),)
+
+    def to_dict(self):
+        return {
+            "checked_at": self.checked_at.strftime("%d-%m-%Y %H:%M:%S"),
+            "ssl": self.ssl,
+            "status": self.status if self.status is not None else "N/A",
+            "availability": "available" if self.available else "not available"
+        }
+
+
+class DomainAlert(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.String(20), nullable=False)
+    text = db.Column(db.String(1024), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime, index=True)
+    # Set by the bot process that is delivering the alert; an expired claim can be taken over.
+    claim_token = db.Column(db.String(32))
+    claimed_until = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "chat_id": self.chat_id,
+            "text": self.text,
+            "created_at": self.created_at.strftime("%d-%m-%Y %H:%M:%S")
+        }
+
+
+class TableVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Tables whose read endpoints answer conditional requests from their version counter.
+VERSIONED_TABLES = {ToDo.__tablename__, User.__tablename__}
+
+
+def bump_table_versions(connection, tables):
+    versions = TableVersion.__table__
+    now = datetime.utcnow()
+    for name in tables:
+        updated = connection.execute(
+            versions.update().where(versions.c.name == name).values(version=versions.c.version + 1, updated_at=now)
+        ).rowcount
+        if not updated:
+            connection.execute(versions.insert().values(name=name, version=1, updated_at=now))
+
+
+@event.listens_for(Session, "after_flush")
+def track_flushed_changes(session, flush_context):
+    changed = chain(session.new, session.deleted, (obj for obj in session.dirty if session.is_modified(obj)))
+    tables = {obj.__table__.name for obj in changed} & VERSIONED_TABLES
+    if tables:
+        bump_table_versions(session.connection(), tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def track_bulk_changes(orm_execute_state):
+    """Bulk INSERT/UPDATE/DELETE statements bypass the flush, so count them here."""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        name = orm_execute_state.statement.table.name
+        if name in VERSIONED_TABLES:
+            bump_table_versions(orm_execute_state.session.connection(), {name})
@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import selectinload
+
+from domain_checker import check_domains
+from models import db, WatchedDomain, DomainWatcher, DomainCheck, DomainAlert
+
+MONITOR_TICK = float(os.getenv("MONITOR_TICK", "10"))
+MONITOR_CHECKS_PER_MINUTE = int(os.getenv("MONITOR_CHECKS_PER_MINUTE", "600"))
+MONITOR_DEFAULT_INTERVAL = int(os.getenv("MONITOR_DEFAULT_INTERVAL", "300"))
+MONITOR_MIN_INTERVAL = int(os.getenv("MONITOR_MIN_INTERVAL", "60"))
+MONITOR_HISTORY_RETENTION_DAYS = int(os.getenv("MONITOR_HISTORY_RETENTION_DAYS", "30"))
+MONITOR_ALERT_RETENTION_DAYS = int(os.getenv("MONITOR_ALERT_RETENTION_DAYS", "7"))
+PRUNE_EVERY = 3600
+
+logger = logging.getLogger(__name__)
+
+
+def check_state(result):
+    return result["ssl"], str(result["status"]), result["availability"]
+
+
+def describe_change(domain, old, new):
+    labels = ("SSL", "Status", "Availability")
+    changes = [f"{label}: {before} → {after}" for label, before, after in zip(labels, old, new) if before != after]
+    return f"🔔 {domain}\n" + "\n".join(changes)
+
+
+def run_cycle():
+    """Re-check the domains that are due, within this tick's share of the rate limit.
+
+    History rows and alerts of the whole cycle are written with one bulk insert each.
+    Domains the check deadline cut off are left due for the next tick. Returns the
+    number of domains checked.
+    """
+    budget = max(1, int(MONITOR_CHECKS_PER_MINUTE * MONITOR_TICK / 60))
+    now = datetime.utcnow()
+    due = (WatchedDomain.query.options(selectinload(WatchedDomain.watchers))
+           .filter(WatchedDomain.next_check_at <= now)
+           .order_by(WatchedDomain.next_check_at).limit(budget).all())
+    if not due:
+        return 0
+    # Monitoring must observe the current state, so it bypasses the result cache.
+    results = check_domains([watched.domain for watched in due], use_cache=False)
+
+    history, alerts = [], []
+    checked_at = datetime.utcnow()
+    for watched, result in zip(due, results):
+        if result.get("deadline_exceeded"):
+            # Never probed to the end, so it says nothing about the domain and must not raise an alert.
+            continue
+        state = check_state(result)
+        previous = (watched.last_ssl, watched.last_status, watched.last_availability)
+        if watched.last_checked_at is not None and state != previous:
+            text = describe_change(watched.domain, previous, state)
+            alerts.extend({"chat_id": watcher.chat_id, "text": text, "created_at": checked_at}
+                          for watcher in watched.watchers)
+        watched.last_ssl, watched.last_status, watched.last_availability = state
+        watched.last_checked_at = checked_at
+        watched.next_check_at = checked_at + timedelta(seconds=watched.interval)
+        history.append({
+            "watched_domain_id": watched.id,
+            "checked_at": checked_at,
+            "ssl": result["ssl"],
+            "status": result["status"] if isinstance(result["status"], int) else None,
+            "available": result["availability"] == "available",
+        })
+    if history:
+        db.session.execute(insert(DomainCheck), history)
+    if alerts:
+        db.session.execute(insert(DomainAlert), alerts)
+    db.session.commit()
+    if len(history) < len(due):
+        logger.warning("%s watched domains hit the check deadline and stay due", len(due) - len(history))
+    return len(history)
+
+
+def prune():
+    now = datetime.utcnow()
+    db.session.execute(delete(DomainCheck).where(
+        DomainCheck.checked_at < now - timedelta(days=MONITOR_HISTORY_RETENTION_DAYS)))
+    db.session.execute(delete(DomainAlert).where(
+        DomainAlert.created_at < now - timedelta(days=MONITOR_ALERT_RETENTION_DAYS)))
+    db.session.commit()
+
+
+def run(app, stop_event=None):
+    """Run the monitoring loop until stop_event is set."""
+    stop_event = stop_event or threading.Event()
+    next_prune = 0
+    with app.app_context():
+        while not stop_event.is_set():
+            started = time.monotonic()
+            try:
+                checked = run_cycle()
+                if checked:
+                    logger.info("Checked %s watched domains", checked)
+                if started >= next_prune:
+                    prune()
+                    next_prune = started + PRUNE_EVERY
+            except Exception:
+                logger.exception("Monitoring cycle failed")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+            stop_event.wait(max(0.0, MONITOR_TICK - (time.monotonic() - started)))
+
+
+def watch(domains, chat_id, interval):
+    """Add chat_id as a watcher of every domain, creating the watched rows that are missing."""
+    query = WatchedDomain.query.options(selectinload(WatchedDomain.watchers))
+    existing = {watched.domain: watched for watched in query.filter(WatchedDomain.domain.in_(domains))}
+    watched_domains = []
+    for domain in domains:
+        watched = existing.get(domain)
+        if watched is None:
+            watched = existing[domain] = WatchedDomain(domain=domain, interval=interval)
+            db.session.add(watched)
+        else:
+            watched.interval = interval
+        if all(watcher.chat_id != chat_id for watcher in watched.watchers):
+            watched.watchers.append(DomainWatcher(chat_id=chat_id))
+        watched_domains.append(watched)
+    db.session.commit()
+    return watched_domains
+
+
+def unwatch(domains, chat_id):
+    """Remove chat_id from the watchers of domains; domains nobody watches any more are dropped."""
+    removed = 0
+    query = WatchedDomain.query.options(selectinload(WatchedDomain.watchers))
+    for watched in query.filter(WatchedDomain.domain.in_(domains)):
+        for watcher in list(watched.watchers):
+            if watcher.chat_id == chat_id:
+                watched.watchers.remove(watcher)
+                removed += 1
+        if not watched.watchers:
+            db.session.execute(delete(DomainCheck).where(DomainCheck.watched_domain_id == watched.id))
+            db.session.delete(watched)
+    db.session.commit()
+    return removed
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    logging.basicConfig(level=logging.INFO)
+    run(create_app())
@@ -0,0 +1,168 @@
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from metrics import registry
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+RATE_LIMIT_READ_RATE = float(os.getenv("RATE_LIMIT_READ_RATE", "10"))
+RATE_LIMIT_READ_BURST = float(os.getenv("RATE_LIMIT_READ_BURST", "40"))
+RATE_LIMIT_WRITE_RATE = float(os.getenv("RATE_LIMIT_WRITE_RATE", "2"))
+RATE_LIMIT_WRITE_BURST = float(os.getenv("RATE_LIMIT_WRITE_BURST", "20"))
+RATE_LIMIT_DOMAINS_RATE = float(os.getenv("RATE_LIMIT_DOMAINS_RATE", "1"))
+RATE_LIMIT_DOMAINS_BURST = float(os.getenv("RATE_LIMIT_DOMAINS_BURST", "100"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+# Addresses or networks allowed to name the Telegram user a request is made for (the bot); others are keyed by IP.
+RATE_LIMIT_TRUSTED_IPS = [ipaddress.ip_network(ip.strip(), strict=False)
+                          for ip in os.getenv("RATE_LIMIT_TRUSTED_IPS", "127.0.0.1,::1").split(",") if ip.strip()]
+# Reverse proxies in front of the API that append X-Forwarded-For; 0 means clients connect directly.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+DOMAIN_CHECK_MAX_INFLIGHT = int(os.getenv("DOMAIN_CHECK_MAX_INFLIGHT", "200"))
+DOMAIN_JOB_QUEUE_MAX = int(os.getenv("DOMAIN_JOB_QUEUE_MAX", "50"))
+SHED_RETRY_AFTER = float(os.getenv("SHED_RETRY_AFTER", "10"))
+
+TELEGRAM_ID_HEADER = "X-Telegram-Id"
+
+rejected_requests = registry.counter(
+    "api_requests_rejected_total", "Requests refused with 429, by budget or shedding reason.", ("reason",))
+
+
+class TokenBucketLimiter:
+    """Token buckets per client, refilled at rate tokens per second up to burst.
+
+    A request costing more than burst is let through on a full bucket and leaves
+    it in debt, so large batches wait proportionally longer instead of never
+    fitting. Buckets live in the process; the least recently used are dropped
+    past max_clients, which only forgets clients that have long refilled.
+    """
+
+    def __init__(self, rate, burst, max_clients=RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client, cost=1):
+        """Take cost tokens from the bucket of client; return 0 on success or the seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            needed = min(cost, self.burst)
+            if tokens >= needed:
+                tokens -= cost
+                wait = 0
+            else:
+                wait = (needed - tokens) / self.rate if self.rate > 0 else SHED_RETRY_AFTER
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class InflightLimit:
+    """Counter of units of work in progress that refuses new work past a maximum."""
+
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, amount):
+        # An idle process always accepts one request, however large, or it could never be served.
+        with self._lock:
+            if self.inflight and self.inflight + amount > self.maximum:
+                return False
+            self.inflight += amount
+            return True
+
+    def release(self, amount):
+        with self._lock:
+            self.inflight -= amount
+
+
+limiters = {
+    "read": TokenBucketLimiter(RATE_LIMIT_READ_RATE, RATE_LIMIT_READ_BURST),
+    "write": TokenBucketLimiter(RATE_LIMIT_WRITE_RATE, RATE_LIMIT_WRITE_BURST),
+    "domains": TokenBucketLimiter(RATE_LIMIT_DOMAINS_RATE, RATE_LIMIT_DOMAINS_BURST),
+}
+domain_checks = InflightLimit(DOMAIN_CHECK_MAX_INFLIGHT)
+registry.gauge("api_domain_checks_inflight", "Domains being checked by request handlers of this process.",
+               lambda: domain_checks.inflight)
+
+
+def rate_limited(budget, cost=None):
+    """Charge a view to budget instead of the read/write one picked by method; cost() gives the tokens it takes."""
+
+    def decorator(view):
+        view.rate_limit = (budget, cost)
+        return view
+
+    return decorator
+
+
+def is_trusted(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except (TypeError, ValueError):
+        return False
+    return any(address in network for network in RATE_LIMIT_TRUSTED_IPS)
+
+
+def configure_proxy(app, hops=TRUSTED_PROXY_HOPS):
+    """Take the client address from the X-Forwarded-* headers set by the last hops proxies.
+
+    Only the entries those proxies appended are used, so a client cannot pick its own
+    address by sending the header itself. Without this, every client behind a proxy
+    shares the proxy's address and its rate limit bucket.
+    """
+    if hops > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+
+def client_key():
+    """The Telegram user a trusted client (the bot) acts for, otherwise the client address.
+
+    Anyone else could send a new X-Telegram-Id with every request and never run out of tokens.
+    """
+    telegram_id = request.headers.get(TELEGRAM_ID_HEADER, "").strip()
+    if telegram_id and is_trusted(request.remote_addr):
+        return f"tg:{telegram_id}"
+    return f"ip:{request.remote_addr}"
+
+
+def too_many_requests(reason, retry_after, error="Too many requests, try again later"):
+    """429 response telling the client how many seconds to wait."""
+    rejected_requests.inc(reason=reason)
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify({"error": error, "retry_after": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+
+def configure_rate_limits(app):
+    """Apply the per-client budgets to every API request; register after instrument_app so 429s are measured."""
+    if not RATE_LIMIT_ENABLED:
+        return
+
+    @app.before_request
+    def check_rate_limit():
+        view = current_app.view_functions.get(request.endpoint)
+        if view is None or not request.blueprint:
+            return None
+        budget, cost = getattr(view, "rate_limit", None) or ("read" if request.method == "GET" else "write", None)
+        wait = limiters[budget].acquire(client_key(), cost() if cost else 1)
+        if wait:
+            return too_many_requests(budget, wait)
+        return None
@@ -0,0 +1,140 @@
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DOMAIN_DNS_TTL = float(os.getenv("DOMAIN_DNS_TTL", "300"))
+DOMAIN_DNS_NEGATIVE_TTL = float(os.getenv("DOMAIN_DNS_NEGATIVE_TTL", "60"))
+DOMAIN_DNS_TIMEOUT = float(os.getenv("DOMAIN_DNS_TIMEOUT", "3"))
+DOMAIN_DNS_WORKERS = int(os.getenv("DOMAIN_DNS_WORKERS", "64"))
+DOMAIN_DNS_CACHE_SIZE = int(os.getenv("DOMAIN_DNS_CACHE_SIZE", "10000"))
+
+# getaddrinfo errors that mean the name does not exist, as opposed to a resolver that is struggling.
+NXDOMAIN_ERRORS = {socket.EAI_NONAME} | ({socket.EAI_NODATA} if hasattr(socket, "EAI_NODATA") else set())
+NXDOMAIN = ()
+
+# getaddrinfo blocks, so lookups get their own pool instead of taking probe workers.
+resolver_executor = ThreadPoolExecutor(max_workers=DOMAIN_DNS_WORKERS, thread_name_prefix="dns")
+
+
+def lookup(host):
+    """Resolve host to getaddrinfo tuples, NXDOMAIN if the name does not exist, or None if the lookup failed."""
+    try:
+        return tuple(socket.getaddrinfo(host, None, type=socket.SOCK_STREAM))
+    except socket.gaierror as e:
+        return NXDOMAIN if e.errno in NXDOMAIN_ERRORS else None
+    except (OSError, UnicodeError):
+        return None
+
+
+class DnsCache:
+    """LRU cache of host lookups, kept DOMAIN_DNS_TTL seconds (DOMAIN_DNS_NEGATIVE_TTL for NXDOMAIN).
+
+    getaddrinfo does not expose record TTLs, so the TTLs are fixed. Failed lookups
+    (timeouts, SERVFAIL) are not cached. Concurrent lookups of one host share a future.
+    """
+
+    def __init__(self, ttl, negative_ttl, max_size):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        """Return the cached answer for host, or None if there is none."""
+        key = host.lower()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, addresses = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return addresses
+
+    def _store(self, host, future):
+        addresses = future.result()
+        with self._lock:
+            self._inflight.pop(host, None)
+            ttl = self.negative_ttl if addresses == NXDOMAIN else self.ttl
+            if addresses is None or ttl <= 0 or self.max_size <= 0:
+                return
+            self._entries[host] = (time.monotonic() + ttl, addresses)
+            self._entries.move_to_end(host)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _lookup_future(self, host):
+        """Return the future of the lookup of host, starting one unless it is already running."""
+        with self._lock:
+            future = self._inflight.get(host)
+            leader = future is None
+            if leader:
+                future = self._inflight[host] = resolver_executor.submit(lookup, host)
+        if leader:
+            # Outside the lock: the callback runs right here if the lookup already finished.
+            future.add_done_callback(lambda f: self._store(host, f))
+        return future
+
+    def resolve(self, host, timeout=None):
+        """Resolve one host through the cache, joining a lookup that is already running.
+
+        Raises concurrent.futures.TimeoutError if no answer arrives within timeout; the lookup
+        keeps running and its answer is cached.
+        """
+        host = host.lower()
+        cached = self.get(host)
+        return cached if cached is not None else self._lookup_future(host).result(timeout)
+
+    def resolve_all(self, hosts, timeout=DOMAIN_DNS_TIMEOUT):
+        """Resolve hosts concurrently and return {host: addresses, NXDOMAIN or None}.
+
+        Hosts still resolving after timeout map to None; their lookups keep running
+        and land in the cache for later probes.
+        """
+        answers, futures = {}, {}
+        for host in {host.lower() for host in hosts}:
+            cached = self.get(host)
+            if cached is not None:
+                answers[host] = cached
+            else:
+                futures[self._lookup_future(host)] = host
+        done, _ = wait(futures, timeout=timeout)
+        for future, host in futures.items():
+            answers[host] = future.result() if future in done else None
+        return answers
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+dns_cache = DnsCache(DOMAIN_DNS_TTL, DOMAIN_DNS_NEGATIVE_TTL, DOMAIN_DNS_CACHE_SIZE)
+
+
+def open_socket(addresses, port, timeout, source_address=None, socket_options=None):
+    """Connect to the first reachable address of a pre-resolved host, like socket.create_connection does."""
+    error = None
+    for family, socktype, proto, _, sockaddr in addresses:
+        sock = None
+        try:
+            sock = socket.socket(family, socktype, proto)
+            for option in socket_options or ():
+                sock.setsockopt(*option)
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect((sockaddr[0], port) + tuple(sockaddr[2:]))
+            return sock
+        except OSError as e:
+            error = e
+            if sock is not None:
+                sock.close()
+    raise error or OSError("No addresses to connect to")
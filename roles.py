@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import os
+
+ADMIN_GROUPS = {x.strip() for x in os.getenv("ADMIN_GROUPS", "admin").split(",") if x.strip()}
+ROLE_REFRESH_INTERVAL = float(os.getenv("ROLE_REFRESH_INTERVAL", "30"))
+ROLE_FULL_REFRESH_INTERVAL = float(os.getenv("ROLE_FULL_REFRESH_INTERVAL", "600"))
+
+logger = logging.getLogger(__name__)
+
+
+class RoleIndex:
+    """In-memory telegram_id -> group index of the API's users, so role checks need no API call.
+
+    The index is refreshed incrementally with /get-users?updated_since=..., and fully
+    every ROLE_FULL_REFRESH_INTERVAL seconds to pick up users deleted elsewhere.
+    Changes made through the bot are applied to it right away.
+    """
+
+    def __init__(self, api, admin_ids=()):
+        self.api = api
+        self.admin_ids = {str(x) for x in admin_ids}
+        self.groups = {}
+        self.synced_at = None
+
+    def group_of(self, telegram_id):
+        return self.groups.get(str(telegram_id))
+
+    def is_admin(self, telegram_id):
+        telegram_id = str(telegram_id)
+        return telegram_id in self.admin_ids or self.groups.get(telegram_id) in ADMIN_GROUPS
+
+    def set_user(self, user):
+        self.groups[str(user["telegram_id"])] = user["group"]
+
+    def remove_user(self, telegram_id):
+        self.groups.pop(str(telegram_id), None)
+
+    async def refresh(self, full=False):
+        """Pull users changed since the last sync (or all of them); returns False if the API failed."""
+        params = {} if full or self.synced_at is None else {"updated_since": self.synced_at}
+        response = await self.api.get("/get-users", params=params, conditional=not params)
+        if response.status_code != 200:
+            return False
+        data = response.json()
+        users = {str(user["telegram_id"]): user["group"] for user in data.get("users", [])}
+        if params:
+            self.groups.update(users)
+        else:
+            self.groups = users
+        self.synced_at = data.get("synced_at")
+        return True
+
+    async def run(self):
+        """Keep the index fresh until cancelled."""
+        loop = asyncio.get_running_loop()
+        next_full = 0
+        while True:
+            full = loop.time() >= next_full
+            try:
+                if await self.refresh(full=full) and full:
+                    next_full = loop.time() + ROLE_FULL_REFRESH_INTERVAL
+            except Exception:
+                logger.exception("Failed to refresh the role index")
+            await asyncio.sleep(ROLE_REFRESH_INTERVAL)
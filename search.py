@@ -0,0 +1,104 @@
+import re
+
+from sqlalchemy import and_, func, literal_column, text
+
+from models import db, ToDo
+
+FTS_TABLE = "todo_fts"
+TODO_TABLE = ToDo.__table__.name
+
+# External-content FTS5 index over ToDo.description, kept in sync by triggers so every
+# write path (single-row endpoints, bulk statements, delete-all) updates it.
+FTS_SCHEMA = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"description, content='{TODO_TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TODO_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TODO_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description ON {TODO_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+]
+
+# PostgreSQL searches a GIN expression index; 'simple' lowercases words without stemming, like unicode61 above.
+PG_SEARCH_CONFIG = "simple"
+PG_SEARCH_INDEX = f"ix_{TODO_TABLE}_description_fts"
+
+_fts_enabled = None
+
+
+def fts_enabled():
+    global _fts_enabled
+    if _fts_enabled is None:
+        _fts_enabled = db.engine.dialect.name == "sqlite" and db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first() is not None
+    return _fts_enabled
+
+
+def pg_search_vector():
+    # The configuration is inlined as a literal so the expression matches the one indexed.
+    return func.to_tsvector(literal_column(f"'{PG_SEARCH_CONFIG}'::regconfig"), ToDo.description)
+
+
+def ensure_search_index():
+    """Create the full-text index: a GIN index on PostgreSQL, or an FTS5 table and its triggers on SQLite
+    builds that have FTS5, filled from existing rows."""
+    if db.engine.dialect.name == "postgresql":
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {PG_SEARCH_INDEX} ON {TODO_TABLE} "
+                f"USING gin (to_tsvector('{PG_SEARCH_CONFIG}'::regconfig, description))"
+            ))
+        return
+    if db.engine.dialect.name != "sqlite":
+        return
+    with db.engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first()
+        if exists:
+            return
+        if not connection.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+            return
+        for statement in FTS_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def search_terms(query):
+    return re.findall(r"\w+", query.lower())
+
+
+def search_todos(query, limit, offset):
+    """Return up to limit ToDo rows matching every term of query, best matches first.
+
+    The last term matches as a prefix so results show up while a word is still being typed.
+    SQLite with FTS5 and PostgreSQL rank by relevance; other databases match the same
+    terms with LIKE, which scans the table, and return results newest first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    if fts_enabled():
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        ids = db.session.scalars(
+            text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match ORDER BY rank "
+                 "LIMIT :limit OFFSET :offset"),
+            {"match": match, "limit": limit, "offset": offset},
+        ).all()
+        todos = {todo.id: todo for todo in ToDo.query.filter(ToDo.id.in_(ids))}
+        return [todos[todo_id] for todo_id in ids if todo_id in todos]
+    if db.engine.dialect.name == "postgresql":
+        vector = pg_search_vector()
+        config = literal_column(f"'{PG_SEARCH_CONFIG}'::regconfig")
+        # plainto_tsquery has no prefix syntax, so the last term gets its own to_tsquery.
+        query = func.to_tsquery(config, f"'{terms[-1]}':*")
+        if len(terms) > 1:
+            query = func.plainto_tsquery(config, " ".join(terms[:-1])).op("&&")(query)
+        return (ToDo.query.filter(vector.op("@@")(query))
+                .order_by(func.ts_rank(vector, query).desc(), ToDo.id.desc())
+                .limit(limit).offset(offset).all())
+    condition = and_(*[ToDo.description.icontains(term, autoescape=True) for term in terms])
+    return ToDo.query.filter(condition).order_by(ToDo.id.desc()).limit(limit).offset(offset).all()
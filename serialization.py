@@ -0,0 +1,89 @@
+from datetime import datetime
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import String
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M:%S"
+COLUMNAR_MIMETYPE = "application/vnd.todoplash.columnar+json"
+
+
+class format_timestamp(FunctionElement):
+    """A DateTime column rendered as TIMESTAMP_FORMAT text by the database itself.
+
+    Backends without a known formatting function return the raw value, which
+    fetch_rows() then formats in Python.
+    """
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(format_timestamp)
+def compile_format_timestamp(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(format_timestamp, "sqlite")
+def compile_format_timestamp_sqlite(element, compiler, **kw):
+    return f"strftime('{TIMESTAMP_FORMAT}', {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(format_timestamp, "postgresql")
+def compile_format_timestamp_postgresql(element, compiler, **kw):
+    return f"to_char({compiler.process(element.clauses, **kw)}, 'DD-MM-YYYY HH24:MI:SS')"
+
+
+@compiles(format_timestamp, "mysql")
+def compile_format_timestamp_mysql(element, compiler, **kw):
+    return f"DATE_FORMAT({compiler.process(element.clauses, **kw)}, '%%d-%%m-%%Y %%H:%%i:%%s')"
+
+
+def fetch_rows(session, statement):
+    """Execute statement and return plain tuples, formatting any datetimes the database left as they were."""
+    rows = session.execute(statement).all()
+    if rows and any(isinstance(value, datetime) for value in rows[0]):
+        return [tuple(value.strftime(TIMESTAMP_FORMAT) if isinstance(value, datetime) else value for value in row)
+                for row in rows]
+    return [tuple(row) for row in rows]
+
+
+def wants_columnar():
+    return request.accept_mimetypes.best_match(["application/json", COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE
+
+
+def rows_response(key, columns, rows, **extra):
+    """Respond with rows as a list of objects under key, or as {"columns", "rows"} when the client asks for it."""
+    if wants_columnar():
+        body, mimetype = {"columns": list(columns), "rows": rows, **extra}, COLUMNAR_MIMETYPE
+    else:
+        body, mimetype = {key: [dict(zip(columns, row)) for row in rows], **extra}, "application/json"
+    return current_app.response_class(current_app.json.dumps(body), mimetype=mimetype)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, producing the same output as the default one.
+
+    Datetimes, dates and other non-native types still go through the default hook.
+    """
+
+    option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+              if orjson else 0)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def configure_json(app):
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,184 @@
+import asyncio
+import hmac
+import logging
+import os
+import time
+
+from aiohttp import web
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+
+from metrics import registry, serve_metrics
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT", "2"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+logger = logging.getLogger(__name__)
+
+update_wait = registry.histogram("bot_update_queue_wait_seconds", "Time updates spend in the webhook queue.")
+updates = registry.counter("bot_updates_total", "Webhook updates by outcome.", ("outcome",))
+
+
+def chat_key(data):
+    """Return the chat (or user) an update belongs to, so its updates can be kept in order."""
+    for field, payload in data.items():
+        if field == "update_id" or not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = payload.get("from") or payload.get("user")
+        if user:
+            return user["id"]
+    return data.get("update_id", 0)
+
+
+class UpdateQueue:
+    """Bounded update queue drained by a fixed pool of workers.
+
+    Every chat is pinned to one worker shard, so a chat's updates are handled one at a time
+    in arrival order while different chats are handled concurrently. When a shard is full,
+    enqueue waits up to WEBHOOK_ENQUEUE_TIMEOUT and then gives up, so the receiver can
+    answer 503 and Telegram redelivers the update later.
+    """
+
+    def __init__(self, dispatcher, bot, workers=WEBHOOK_WORKERS, size=WEBHOOK_QUEUE_SIZE):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.shards = [asyncio.Queue(maxsize=max(1, size // workers)) for _ in range(workers)]
+        self.workers = []
+        self.stats = {"received": 0, "processed": 0, "failed": 0, "rejected": 0,
+                      "wait_ms_total": 0.0, "wait_ms_max": 0.0, "busy": 0}
+        registry.gauge("bot_update_queue_depth", "Updates waiting in the webhook queue.",
+                       lambda: sum(shard.qsize() for shard in self.shards))
+        registry.gauge("bot_update_workers_busy", "Webhook workers handling an update.", lambda: self.stats["busy"])
+
+    async def put(self, data):
+        shard = self.shards[hash(chat_key(data)) % len(self.shards)]
+        try:
+            await asyncio.wait_for(shard.put((time.monotonic(), data)), WEBHOOK_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            updates.inc(outcome="rejected")
+            return False
+        self.stats["received"] += 1
+        return True
+
+    async def work(self, shard):
+        while True:
+            enqueued_at, data = await shard.get()
+            wait_ms = (time.monotonic() - enqueued_at) * 1000
+            update_wait.observe(wait_ms / 1000)
+            self.stats["wait_ms_total"] += wait_ms
+            self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], wait_ms)
+            self.stats["busy"] += 1
+            try:
+                update = Update.model_validate(data, context={"bot": self.bot})
+                response = await self.dispatcher.feed_update(self.bot, update)
+                # Handlers may return a method instead of calling it, as webhook replies allow.
+                if isinstance(response, TelegramMethod):
+                    await self.bot(response)
+                self.stats["processed"] += 1
+                updates.inc(outcome="processed")
+            except Exception:
+                self.stats["failed"] += 1
+                updates.inc(outcome="failed")
+                logger.exception("Failed to handle update %s", data.get("update_id"))
+            finally:
+                self.stats["busy"] -= 1
+                shard.task_done()
+
+    def start(self):
+        self.workers = [asyncio.create_task(self.work(shard)) for shard in self.shards]
+
+    async def stop(self, timeout=10):
+        """Let the workers drain what is already queued, then cancel them."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(shard.join() for shard in self.shards)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %s queued updates on shutdown", sum(s.qsize() for s in self.shards))
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+    def metrics(self):
+        depths = [shard.qsize() for shard in self.shards]
+        handled = self.stats["processed"] + self.stats["failed"]
+        return {
+            **{key: value for key, value in self.stats.items() if key != "wait_ms_total"},
+            "queued": sum(depths),
+            "capacity": sum(shard.maxsize for shard in self.shards),
+            "max_shard_depth": max(depths),
+            "wait_ms_avg": round(self.stats["wait_ms_total"] / handled, 2) if handled else 0.0,
+            "wait_ms_max": round(self.stats["wait_ms_max"], 2),
+        }
+
+
+def create_app(queue, secret=WEBHOOK_SECRET):
+    """The public listener: only the webhook itself, accepting updates signed with secret."""
+
+    async def receive(request):
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token.encode(), secret.encode()):
+            return web.json_response({"error": "Invalid secret token"}, status=401)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+        if not await queue.put(data):
+            return web.json_response({"error": "Update queue is full"}, status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    return app
+
+
+async def run_webhook(dispatcher, bot, url, metrics_port=0):
+    """Register the webhook with Telegram and serve updates until cancelled.
+
+    /metrics and /stats (the queue counters) are served on metrics_port, a separate
+    listener that is not meant to be published, rather than next to the webhook.
+    """
+    if not url:
+        raise RuntimeError("WEBHOOK_URL must be set to run the bot in webhook mode")
+    # Without a secret anyone reaching the port could post updates on behalf of any user, admins included.
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET must be set to run the bot in webhook mode")
+    queue = UpdateQueue(dispatcher, bot)
+
+    async def stats(request):
+        return web.json_response(queue.metrics())
+
+    status_runner = None
+    runner = web.AppRunner(create_app(queue))
+    workflow_data = {"dispatcher": dispatcher, "bot": bot, **dispatcher.workflow_data}
+    await dispatcher.emit_startup(**workflow_data)
+    queue.start()
+    await runner.setup()
+    try:
+        if metrics_port:
+            status_runner = await serve_metrics("0.0.0.0", metrics_port, {"/stats": stats})
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(
+            url.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+        logger.info("Receiving updates on %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+        await asyncio.Event().wait()
+    finally:
+        # Stop accepting updates first; Telegram keeps the unacknowledged ones for redelivery.
+        await runner.cleanup()
+        if status_runner is not None:
+            await status_runner.cleanup()
+        await queue.stop()
+        await dispatcher.emit_shutdown(**workflow_data)
+        await bot.session.close()